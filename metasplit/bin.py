@@ -1,6 +1,10 @@
 from pathlib import Path
 
-from metasplit.core import metasplit, MetaPath
+from metasplit.core import metasplit, MetaPath, BACKENDS
+from metasplit.dialect import DEFAULT_ENCODING
+from metasplit.progress import Progress, DEFAULT_INTERVAL
+from metasplit.store import import_metadata
+from metasplit.writer import WriterOptions, COMPRESSIONS, DEFAULT_BLOCK_SIZE
 
 
 def main():
@@ -15,10 +19,14 @@ def main():
         help="Selection string(s). Read the README for a guide on how to write these.",
     )
     parser.add_argument(
-        "input_csv", type=Path, help="The csv to subset with the metadata."
+        "input_csv",
+        type=Path,
+        help="The csv to subset with the metadata. Use '-' to read from stdin (not with the 'xsv' or 'parallel' backends).",
     )
     parser.add_argument(
-        "output_csv", type=Path, help="The file to save the subsetted data in."
+        "output_csv",
+        type=Path,
+        help="The file to save the subsetted data in. Use '-' to write to stdout (not with the 'xsv' or 'parallel' backends).",
     )
     parser.add_argument(
         "--ignore_missing",
@@ -28,8 +36,8 @@ def main():
     parser.add_argument(
         "--input_delimiter",
         type=str,
-        default=",",
-        help="The delimiter to use in the input file.",
+        default=None,
+        help="The delimiter to use in the input file. Detected automatically if not given.",
     )
     parser.add_argument(
         "--always_include",
@@ -42,6 +50,82 @@ def main():
         action="store_true",
         help="If set, combine different metadata files with an 'AND' selector istead of an 'OR'.",
     )
+    parser.add_argument(
+        "--backend",
+        choices=("auto", *BACKENDS),
+        default="auto",
+        help="The backend that does the splitting. By default, it's chosen based on the input.",
+    )
+    parser.add_argument(
+        "--block_size",
+        type=int,
+        default=DEFAULT_BLOCK_SIZE,
+        help="Size in bytes of the blocks written to the output file. Not for the 'xsv' backend.",
+    )
+    parser.add_argument(
+        "--writer_thread",
+        action="store_true",
+        help="Write the output from a dedicated thread. Not for the 'xsv' backend.",
+    )
+    parser.add_argument(
+        "--compression",
+        choices=COMPRESSIONS,
+        default=None,
+        help="Compress the output file. Not for the 'xsv' backend.",
+    )
+    parser.add_argument(
+        "--compression_threads",
+        type=int,
+        default=None,
+        help="Number of threads used to compress the output. Defaults to the number of cores.",
+    )
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        help="Fsync the output before moving it into place. Not for the 'xsv' backend.",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Periodically report the progress of the split.",
+    )
+    parser.add_argument(
+        "--progress_file",
+        type=Path,
+        default=None,
+        help="Also append progress reports to this file, as JSON lines. Implies --progress.",
+    )
+    parser.add_argument(
+        "--progress_interval",
+        type=float,
+        default=DEFAULT_INTERVAL,
+        help="Seconds between two progress reports.",
+    )
+    parser.add_argument(
+        "--encoding",
+        type=str,
+        default=DEFAULT_ENCODING,
+        help="The encoding of the header names and metadata values. The data itself is copied as-is.",
+    )
+    preview = parser.add_mutually_exclusive_group()
+    preview.add_argument(
+        "--head",
+        type=int,
+        default=None,
+        help="Only keep the first N rows, to quickly preview the split.",
+    )
+    preview.add_argument(
+        "--sample",
+        type=int,
+        default=None,
+        help="Only keep N random rows, to preview the split. Reads the input once.",
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=None,
+        help="Seed for --sample, to pick the same rows every time.",
+    )
     parser.add_argument("--verbose", action="store_true", help="Increase verbosity")
 
     args = parser.parse_args()
@@ -55,6 +139,27 @@ def main():
         for handler in root_logger.handlers:
             handler.setLevel(logging.DEBUG)
 
+    writer_options = None
+    if (
+        args.compression
+        or args.writer_thread
+        or args.fsync
+        or args.block_size != DEFAULT_BLOCK_SIZE
+    ):
+        if args.backend == "xsv":
+            parser.error("Output writer options cannot be used with the 'xsv' backend.")
+        writer_options = WriterOptions(
+            block_size=args.block_size,
+            threaded=args.writer_thread,
+            compression=args.compression,
+            compression_threads=args.compression_threads,
+            fsync=args.fsync,
+        )
+
+    progress = None
+    if args.progress or args.progress_file:
+        progress = Progress(interval=args.progress_interval, file=args.progress_file)
+
     metasplit(
         metadata=[MetaPath(x) for x in args.selection_string],
         input_file=args.input_csv,
@@ -63,4 +168,54 @@ def main():
         ignore_missing=args.ignore_missing,
         input_delimiter=args.input_delimiter,
         always_include=always_include,
+        backend=args.backend,
+        writer_options=writer_options,
+        progress=progress,
+        encoding=args.encoding,
+        head=args.head,
+        sample=args.sample,
+        seed=args.seed,
+    )
+
+
+def import_main():
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Import a metadata csv in a SQLite store, to be used in selection strings in place of the csv."
+    )
+
+    parser.add_argument("metadata_csv", type=Path, help="The metadata csv to import.")
+    parser.add_argument(
+        "output_store",
+        type=Path,
+        help="The SQLite file to create. Should end in '.sqlite'.",
+    )
+    parser.add_argument(
+        "--index",
+        type=str,
+        default=None,
+        help="A comma-separated list of columns to index. These should be the columns used in selections. Defaults to every column.",
+    )
+    parser.add_argument(
+        "--delimiter",
+        type=str,
+        default=None,
+        help="The delimiter of the metadata csv. Detected automatically if not given.",
+    )
+    parser.add_argument(
+        "--encoding",
+        type=str,
+        default=DEFAULT_ENCODING,
+        help="The encoding of the metadata csv.",
+    )
+
+    args = parser.parse_args()
+
+    import_metadata(
+        args.metadata_csv,
+        args.output_store,
+        index_columns=args.index.split(",") if args.index else None,
+        delimiter=args.delimiter,
+        encoding=args.encoding,
     )
@@ -3,8 +3,12 @@ from __future__ import annotations
 from pathlib import Path
 from dataclasses import dataclass
 from enum import Enum
-from typing import Optional
+from typing import Iterable, Iterator, Optional
+from array import array
+from itertools import compress
 import logging
+import shutil
+import sys
 
 import subprocess as sb
 import re
@@ -14,6 +18,14 @@ from metasplit.errors import (
     NoSelectionError,
     InvalidSelectionError,
 )
+from metasplit.dialect import DEFAULT_ENCODING, Dialect, sniff
+from metasplit.native import native_select, read_headers
+from metasplit.parallel import QuoteFoundError, available_cores, parallel_select
+from metasplit.preview import preview_select
+from metasplit.progress import Progress
+from metasplit.store import is_store, select_store_ids
+from metasplit.streams import PeekableInput, is_stdio, open_input
+from metasplit.writer import WriterOptions
 
 log = logging.getLogger(__name__)
 
@@ -21,6 +33,16 @@ FILE_VAR_REGEX = re.compile(r"^(.*?)@(.*?)(\?.*?)$")
 """The regex that separates the file path, the id var and the selections"""
 SELECTION_GRABBER_REGEX = re.compile(r"([?&\|].+?)(?:[?&\|]|$)")
 """This regex can match the start of a selection in order to consume it"""
+BACKENDS = ("xsv", "native", "parallel")
+"""The available backends that can do the actual splitting"""
+SMALL_INPUT_SIZE = 64 * 1024 * 1024
+"""Inputs smaller than this (in bytes) are not worth starting a pool or a process for"""
+MAX_XSV_RANGES = 10_000
+"""Selections with more ranges than this make xsv command lines too long"""
+SPARSE_MIN_COLUMNS = 10_000
+"""Inputs with at least this many columns may have a sparse selection"""
+SPARSE_FRACTION = 0.01
+"""Selecting less than this fraction of the columns of a wide input is a sparse selection"""
 
 
 class UnionSign(Enum):
@@ -37,7 +59,7 @@ class SelectionSign(Enum):
     NOT_EQUAL_TO = "!="
 
 
-@dataclass
+@dataclass(slots=True)
 class Selection:
     """This class represents one of the selection expressions in the query"""
 
@@ -117,6 +139,8 @@ class Selection:
 
 
 class MetaPath:
+    __slots__ = ("original", "file", "selection_var", "selections")
+
     def __init__(self, meta_string: str) -> None:
         matches = FILE_VAR_REGEX.search(meta_string)
         if not matches:
@@ -136,9 +160,14 @@ class MetaPath:
         return f"{type(self).__name__} object :: file {self.file} selecting {self.selection_var} on {self.variable} with {self.values}"
 
 
-def exec(*args, **kwargs) -> str:
+def exec(*args, encoding: str = DEFAULT_ENCODING, **kwargs) -> str:
+    # Undecodable bytes are kept as surrogates, so they are never mixed up
     res = sb.run(
-        *args, **kwargs, encoding="UTF-8", capture_output=True, errors="replace"
+        *args,
+        **kwargs,
+        encoding=encoding,
+        capture_output=True,
+        errors="surrogateescape",
     )
 
     if res.returncode != 0:
@@ -149,30 +178,116 @@ def exec(*args, **kwargs) -> str:
     return res.stdout.strip()
 
 
+def _bytes_read_by(pid: int) -> int:
+    """Get how many bytes a process has read so far, if the OS tells us"""
+    try:
+        with open(f"/proc/{pid}/io") as stream:
+            for line in stream:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def exec_with_progress(
+    command: list, progress: Progress, encoding: str = DEFAULT_ENCODING
+) -> str:
+    """Like `exec`, but periodically reports how much input the process has read"""
+    with sb.Popen(
+        command,
+        stdout=sb.PIPE,
+        stderr=sb.PIPE,
+        encoding=encoding,
+        errors="surrogateescape",
+    ) as process:
+        progress.track(lambda: _bytes_read_by(process.pid))
+        progress.start()
+        # We cannot know how many rows an external process went through
+        progress.rows_done = None
+        while True:
+            try:
+                stdout, stderr = process.communicate(timeout=progress.interval)
+                break
+            except sb.TimeoutExpired:
+                progress.update()
+
+    if process.returncode != 0:
+        raise ReturnCodeError(
+            f"Process exited with code {process.returncode}:\n{stderr}"
+        )
+
+    progress.finish()
+    return stdout.strip()
+
+
 def xsv_select(
     file: Path,
     var: str,
     delim: str = ",",
     include_header: bool = False,
     output_file: Optional[Path] = None,
+    progress: Optional[Progress] = None,
+    encoding: str = DEFAULT_ENCODING,
 ) -> list(str):
     assert file.exists(), f"Cannot run xsv on file {file} that does not exist"
 
     command = ["xsv", "select", "-d", delim, var, file]
     if output_file:
         command.extend(["-o", output_file])
-    values: list[str] = exec(command).split("\n")
+    if progress:
+        values: list[str] = exec_with_progress(command, progress, encoding).split("\n")
+    else:
+        values: list[str] = exec(command, encoding=encoding).split("\n")
     if not include_header:
         values.pop(0)
 
     return values
 
 
-def get_headers(file: Path, delimiter: str = ","):
-    return exec(["xsv", "headers", "-j", "-d", delimiter, file]).split("\n")
+def xsv_iter_column(
+    file: Path,
+    var: str,
+    delim: str = ",",
+    encoding: str = DEFAULT_ENCODING,
+) -> Iterator[str]:
+    """Like `xsv_select` for a single column, but yields the values (without
+    the header) as xsv outputs them, so the column is never held in memory
+    as a whole."""
+    assert file.exists(), f"Cannot run xsv on file {file} that does not exist"
+
+    command = ["xsv", "select", "-d", delim, var, file]
+    with sb.Popen(
+        command,
+        stdout=sb.PIPE,
+        stderr=sb.PIPE,
+        encoding=encoding,
+        errors="surrogateescape",
+    ) as process:
+        try:
+            next(process.stdout, None)  # The header
+            for line in process.stdout:
+                yield line.rstrip("\n")
+        except GeneratorExit:
+            # We were not read to the end: xsv would block on a full pipe
+            process.kill()
+            raise
+        stderr = process.stderr.read()
+
+    if process.returncode != 0:
+        raise ReturnCodeError(
+            f"Process exited with code {process.returncode}:\n{stderr}"
+        )
+
+
+def get_headers(file: Path, delimiter: str = ",", encoding: str = DEFAULT_ENCODING):
+    return exec(
+        ["xsv", "headers", "-j", "-d", delimiter, file], encoding=encoding
+    ).split("\n")
 
 
 def indexes_of(list: list[str], selection: list[str]) -> list[int]:
+    selection = set(selection)
     return [i for i, x in enumerate(list) if x in selection]
 
 
@@ -180,6 +295,63 @@ def invert_index(list_len: int, indexes: list[int]) -> list[int]:
     return [i for i in range(list_len) if i not in indexes]
 
 
+_INVERT_MASK = bytes.maketrans(b"\x00\x01", b"\x01\x00")
+"""Translation table that flips a 0/1 row mask"""
+
+
+class EncodedColumn:
+    """A dictionary-encoded metadata column.
+
+    Every distinct value is stored (interned) only once in `levels`, and each
+    row is just a small integer code pointing into it. For categorical
+    metadata with millions of rows this is a fraction of the size of a list
+    of strings.
+    """
+
+    __slots__ = ("levels", "codes")
+
+    def __init__(self, values: Iterable[str]) -> None:
+        lookup: dict[str, int] = {}
+        self.levels: list[str] = []
+        self.codes: array = array("I")
+
+        for value in values:
+            code = lookup.get(value)
+            if code is None:
+                code = lookup[value] = len(self.levels)
+                self.levels.append(sys.intern(value))
+            self.codes.append(code)
+
+    def mask_of(self, values: Iterable[str]) -> bytearray:
+        """Return a 0/1 mask with one byte per row, set where the row is in `values`"""
+        values = set(values)
+        table = bytes(1 if level in values else 0 for level in self.levels)
+        return bytearray(map(table.__getitem__, self.codes))
+
+
+def mask_or(a: bytearray, b: bytearray) -> bytearray:
+    """Combine two row masks of the same length with a logical OR"""
+    return bytearray(
+        (int.from_bytes(a, "little") | int.from_bytes(b, "little")).to_bytes(
+            len(a), "little"
+        )
+    )
+
+
+def mask_and(a: bytearray, b: bytearray) -> bytearray:
+    """Combine two row masks of the same length with a logical AND"""
+    return bytearray(
+        (int.from_bytes(a, "little") & int.from_bytes(b, "little")).to_bytes(
+            len(a), "little"
+        )
+    )
+
+
+def mask_invert(mask: bytearray) -> bytearray:
+    """Flip every row of a 0/1 mask"""
+    return mask.translate(_INVERT_MASK)
+
+
 class NumberCompressor:
     def __init__(self) -> None:
         self.compressed = []
@@ -235,7 +407,9 @@ def compress_selection_string(selection: list):
     return compressed
 
 
-def select_meta_ids(metadata: list[MetaPath], intersect: bool) -> list[int]:
+def select_meta_ids(
+    metadata: list[MetaPath], intersect: bool, encoding: str = DEFAULT_ENCODING
+) -> list[str]:
     """This function selects the IDs from the metadata files following the MetaPath instructions
 
     Args:
@@ -243,6 +417,7 @@ def select_meta_ids(metadata: list[MetaPath], intersect: bool) -> list[int]:
         intersect (bool): How to handle multiple MetaPaths. If `False`, concatenates
             the result (a sort of OR). If `True`, computes the intersection of
             each MetaPath (a sort of AND).
+        encoding (str): The encoding of the metadata csv files.
 
     Raises:
         NoSelectionError: If any MetaPath selects no IDs
@@ -250,140 +425,384 @@ def select_meta_ids(metadata: list[MetaPath], intersect: bool) -> list[int]:
     Returns:
         list[str]: The selected IDs from the metadata
     """
-    selected_ids = []  # This holds the overall selected indexes, and gets returned
+    selected_ids = []  # This holds the overall selected IDs, and gets returned
 
     # Every MetaPath is processed independently of any other.
     for meta in metadata:
-        # We now need to:
-        # - Find the ID column
-        # - Find which indexes to select IDs with based on the selections
-        # - Convert from indexes to IDs
-        # - Add the IDs to the overall selection
-        this_meta_indexes = []
-        meta_headers = get_headers(meta.file)
-        log.debug(f"Processing {meta.file} - found {len(meta_headers)} headers.")
-        # We how have to process the selections, from right to left, in order
-        # to select the values in this metadata
-
-        for sel in meta.selections:
-            # The variable must be in the headers
-            log.debug(
-                f"Selecting variable {sel.filter_variable} on values {sel.filter_values}"
-            )
-            assert (
-                sel.filter_variable in meta_headers
-            ), f"Variable {sel.filter_variable} not found in metadata headers ({meta_headers})"
-
-            # We can now take out the values for this variable, and convert them
-            # to indexes
-            var_values = xsv_select(meta.file, sel.filter_variable)
-            sel_indexes = indexes_of(var_values, sel.filter_values)
-            log.debug(f"Selected {len(sel_indexes)} selection indexes")
-
-            if not sel_indexes:
-                raise NoSelectionError(
-                    f"Variable {sel.filter_variable} has no selection in {sel.filter_values}"
-                )
-            # Ok, we now have the indexes of this selection.
-            # If the selection was negative (!=) we need to select the opposite
-            # though, and this is what we do here:
-            if sel.sign is SelectionSign.NOT_EQUAL_TO:
-                sel_indexes = invert_index(
-                    len(var_values), sel_indexes
-                )  # We need to select every OTHER index
-                log.debug(f"Inverted selection to {len(sel_indexes)} indexes.")
-
-            # Now we need to add or remove this selection's indexes to the more
-            # generic meta index
-            if sel.union is UnionSign.NEGATIVE:
-                # we need to remove these from the indexes
-                old_len = len(this_meta_indexes)
-                this_meta_indexes = [x for x in this_meta_indexes if x in sel_indexes]
-                log.debug(
-                    f"Negative union: removed {len(this_meta_indexes) - old_len} indexes."
-                )
-            elif sel.union is UnionSign.POSITIVE:
-                # we need to add these from the indexes
-                old_len = len(this_meta_indexes)
-                this_meta_indexes.extend(sel_indexes)
-                this_meta_indexes = list(set(this_meta_indexes))  # remove duplicates
-                log.debug(
-                    f"Positive union: added {len(this_meta_indexes) - old_len} indexes"
-                )
-
-        # When we get here, the indexes are correct, and we parsed all selections
-        # We now have to convert from the indexes to the IDs
-        meta_ids = xsv_select(meta.file, meta.selection_var)
+        if is_store(meta.file):
+            # SQLite stores translate the selections to an indexed query
+            this_meta_ids = select_store_ids(meta)
+        else:
+            this_meta_ids = _select_csv_ids(meta, encoding)
 
         # We need to add these IDs to the selected_ids variable.
         # If we have to compute the intersect, we do so here.
         # If this is the first metadata, there is nothing to intersect with,
         # so we just extend the empty list.
         if intersect and len(selected_ids) != 0:
-            this_meta_ids = [meta_ids[i] for i in this_meta_indexes]
-            # There is no difference in these calls:
-            # - [x for x in this_meta_ids if x in selected_ids]
-            # - [x for x in selected_ids if x in this_meta_ids]
-            # So I just used one of the two.
+            this_meta_ids = set(this_meta_ids)
             selected_ids = [x for x in selected_ids if x in this_meta_ids]
         else:
-            selected_ids.extend([meta_ids[i] for i in this_meta_indexes])
+            selected_ids.extend(this_meta_ids)
 
     # After parsing all selections, we just return.
     log.debug(f"Returning {len(selected_ids)} ids")
     return selected_ids
 
 
-def metasplit(
+def _select_csv_ids(meta: MetaPath, encoding: str = DEFAULT_ENCODING) -> list[str]:
+    """Select the IDs of a single MetaPath that points to a csv file"""
+    # We now need to:
+    # - Find the ID column
+    # - Find which rows to select IDs with based on the selections
+    # - Convert from rows to IDs
+    # Rows are tracked with a 0/1 mask (one byte per row), so that
+    # unions and intersections never build lists of python ints.
+    this_meta_mask = None
+    meta_headers = get_headers(meta.file, encoding=encoding)
+    log.debug(f"Processing {meta.file} - found {len(meta_headers)} headers.")
+    # Columns are dictionary-encoded once and shared by all the selections
+    # that filter on them
+    columns: dict[str, EncodedColumn] = {}
+
+    for sel in meta.selections:
+        # The variable must be in the headers
+        log.debug(
+            f"Selecting variable {sel.filter_variable} on values {sel.filter_values}"
+        )
+        assert (
+            sel.filter_variable in meta_headers
+        ), f"Variable {sel.filter_variable} not found in metadata headers ({meta_headers})"
+
+        # We can now take out the values for this variable, and convert them
+        # to a row mask
+        if sel.filter_variable not in columns:
+            columns[sel.filter_variable] = EncodedColumn(
+                xsv_iter_column(meta.file, sel.filter_variable, encoding=encoding)
+            )
+        var_values = columns[sel.filter_variable]
+        sel_mask = var_values.mask_of(sel.filter_values)
+        sel_count = sel_mask.count(1)
+        log.debug(f"Selected {sel_count} selection indexes")
+
+        if not sel_count:
+            raise NoSelectionError(
+                f"Variable {sel.filter_variable} has no selection in {sel.filter_values}"
+            )
+        # Ok, we now have the rows of this selection.
+        # If the selection was negative (!=) we need to select the opposite
+        # though, and this is what we do here:
+        if sel.sign is SelectionSign.NOT_EQUAL_TO:
+            sel_mask = mask_invert(sel_mask)  # We need to select every OTHER row
+            log.debug(f"Inverted selection to {sel_mask.count(1)} indexes.")
+
+        if this_meta_mask is None:
+            this_meta_mask = bytearray(len(sel_mask))
+
+        # Now we need to add or remove this selection's rows to the more
+        # generic meta mask
+        old_len = this_meta_mask.count(1)
+        if sel.union is UnionSign.NEGATIVE:
+            # we need to remove these from the rows
+            this_meta_mask = mask_and(this_meta_mask, sel_mask)
+            log.debug(
+                f"Negative union: removed {old_len - this_meta_mask.count(1)} indexes."
+            )
+        elif sel.union is UnionSign.POSITIVE:
+            # we need to add these to the rows
+            this_meta_mask = mask_or(this_meta_mask, sel_mask)
+            log.debug(
+                f"Positive union: added {this_meta_mask.count(1) - old_len} indexes"
+            )
+
+    del columns
+
+    # When we get here, the mask is correct, and we parsed all selections
+    # We now have to convert from the selected rows to the IDs, keeping
+    # just the IDs of the selected rows as they stream by
+    meta_ids = xsv_iter_column(meta.file, meta.selection_var, encoding=encoding)
+    return list(compress(meta_ids, this_meta_mask))
+
+
+def detect_dialect(
+    source: Path | PeekableInput, input_delimiter: Optional[str] = None
+) -> tuple[Dialect, str]:
+    """Sample the input to find out its delimiter, and if it can be split
+    without caring about quotes.
+
+    Returns the dialect of the input, and the delimiter to use: the given
+    one, or the detected one if none was given.
+    """
+    dialect = sniff(source)
+    if input_delimiter == r"\t":
+        input_delimiter = "\t"  # Like xsv, accept an escaped tab from the shell
+    if input_delimiter is None:
+        input_delimiter = dialect.delimiter
+        if dialect.confident:
+            log.debug(f"Detected delimiter {input_delimiter!r}")
+        else:
+            log.warning(
+                f"Could not reliably detect the delimiter of {source.name}. Guessing {input_delimiter!r}."
+            )
+    elif input_delimiter != dialect.delimiter and dialect.confident:
+        log.warning(
+            f"The input looks {dialect.delimiter!r}-delimited, but I was told to use {input_delimiter!r}."
+        )
+    return dialect, input_delimiter
+
+
+def resolve_columns(
     metadata: list[MetaPath],
-    input_file: Path,
-    output_file: Path,
+    target_headers: list[str],
     intersect: bool = False,
     ignore_missing: bool = False,
-    input_delimiter: str = ",",
     always_include: Optional[list[str]] = None,
-) -> None:
-    if not input_file.exists():
-        raise ValueError(f"Input csv {input_file} does not exist.")
-
-    target_headers = get_headers(input_file, input_delimiter)
-
-    if len(target_headers) == 1:
-        log.warn(
-            "I only read one header. This might mean you gave me the wrong delimiter."
-        )
+    encoding: str = DEFAULT_ENCODING,
+) -> array:
+    """Find which columns of the target to select, following the metadata.
 
+    Returns:
+        array: The sorted, 0-based indexes of the columns to select.
+    """
     # We can now select the columns of interest
-    selected_ids = select_meta_ids(metadata, intersect)
+    selected_ids = select_meta_ids(metadata, intersect, encoding)
 
     # We now have our Ids. We have to check if they are all in the
     # target file and discard them if we are told to ignore the missing IDs
     if ignore_missing:
-        selected_ids = [id for id in selected_ids if id in target_headers]
+        known_headers = set(target_headers)
+        selected_ids = [id for id in selected_ids if id in known_headers]
 
     if always_include:
         selected_ids.extend(always_include)
         selected_ids = list(dict.fromkeys(selected_ids))
 
-    # For compactness, we have to go back to 1-based column indexes, so our
-    # xsv calls do not exceed the max command len imposed by bash.
-    SELECTIONS = [x + 1 for x in indexes_of(target_headers, selected_ids)]
+    indexes = array("L", indexes_of(target_headers, selected_ids))
 
-    if len(SELECTIONS) == 0:
+    if len(indexes) == 0:
         raise InvalidSelectionError("There is nothing to select.")
 
-    # We're done. We just need to pass these selections to XSV
-
-    log.info(f"Selecting {len(SELECTIONS)} results...")
-    # Compress the IDs further...
-    SELECTIONS = compress_selection_string(SELECTIONS)
-    selection_str = ",".join(SELECTIONS)
-    xsv_select(
-        input_file,
-        selection_str,
-        input_delimiter,
-        include_header=True,
-        output_file=output_file,
-    )
+    log.info(f"Selecting {len(indexes)} results...")
+    return indexes
+
+
+def is_sparse_selection(n_columns: int, n_selected: int) -> bool:
+    """Whether so few of very many columns are selected, that the streaming
+    tokenizer (that skips unselected fields without splitting them) is faster
+    than splitting whole rows."""
+    return n_columns >= SPARSE_MIN_COLUMNS and n_selected < n_columns * SPARSE_FRACTION
+
+
+def choose_backend(
+    input_size: Optional[int],
+    selection: list[str],
+    dialect: Dialect,
+    stdio: bool,
+    n_columns: int = 0,
+    n_selected: int = 0,
+    writer_options: Optional[WriterOptions] = None,
+    cores: Optional[int] = None,
+    xsv_available: Optional[bool] = None,
+) -> tuple[str, str]:
+    """Pick the backend that should be fastest for a split.
+
+    Args:
+        input_size (Optional[int]): The size of the input in bytes, or None if
+            it is not known (e.g. it's a pipe).
+        selection (list[str]): The compressed column selection, as made by
+            `compress_selection_string`.
+        dialect (Dialect): The sniffed dialect of the input.
+        stdio (bool): Whether we read from stdin or write to stdout.
+        n_columns (int): How many columns the input has.
+        n_selected (int): How many of them are selected.
+        writer_options (Optional[WriterOptions]): The requested writer options.
+        cores (Optional[int]): How many cores we can use. Detected if None.
+        xsv_available (Optional[bool]): If xsv can be run. Detected if None.
+
+    Returns:
+        tuple[str, str]: The backend, and the reason why it was chosen.
+    """
+    cores = available_cores() if cores is None else cores
+    if xsv_available is None:
+        xsv_available = shutil.which("xsv") is not None
+
+    if stdio:
+        return "native", "reading from stdin or writing to stdout"
+    if dialect.wide:
+        return "native", "rows are too wide to be held in memory"
+    if is_sparse_selection(n_columns, n_selected):
+        return (
+            "native",
+            f"only {n_selected} of {n_columns} columns are selected, and the rest can be skipped",
+        )
+    if input_size < SMALL_INPUT_SIZE:
+        return "native", "the input is small"
+    if not dialect.quoted and cores > 1:
+        return (
+            "parallel",
+            f"the input is large and has no quotes, and we have {cores} cores",
+        )
+    if writer_options:
+        return "native", "only the native backends support writer options"
+    if not xsv_available:
+        return "native", "xsv is not available"
+    if len(selection) > MAX_XSV_RANGES:
+        return "native", f"the {len(selection)} selected ranges are too many for xsv"
+    return "xsv", "the input is large and needs a full csv parser"
+
+
+def metasplit(
+    metadata: list[MetaPath],
+    input_file: Path,
+    output_file: Path,
+    intersect: bool = False,
+    ignore_missing: bool = False,
+    input_delimiter: Optional[str] = None,
+    always_include: Optional[list[str]] = None,
+    backend: str = "auto",
+    writer_options: Optional[WriterOptions] = None,
+    progress: Optional[Progress] = None,
+    encoding: str = DEFAULT_ENCODING,
+    head: Optional[int] = None,
+    sample: Optional[int] = None,
+    seed: Optional[int] = None,
+) -> None:
+    """Split the input file column-wise, following the metadata.
+
+    The backend that does the split is chosen automatically, unless one is
+    given. The input and output files can be '-', to read from stdin and
+    write to stdout, but not with the 'xsv' or 'parallel' backends.
+
+    Only header names and metadata values are decoded (with `encoding`), to
+    be compared. The cells of the input are copied to the output as bytes.
+
+    To preview a split, give `head` to only keep the first rows of the input,
+    or `sample` to keep that many random rows (reproducibly, with a `seed`).
+    Previews are always made by the native backend.
+    """
+    if not is_stdio(input_file) and not input_file.exists():
+        raise ValueError(f"Input csv {input_file} does not exist.")
+
+    if backend not in ("auto", *BACKENDS):
+        raise ValueError(
+            f"Unknown backend {backend}. Valid backends are {('auto', *BACKENDS)}"
+        )
+    if writer_options and backend == "xsv":
+        raise ValueError("Writer options cannot be used with the 'xsv' backend.")
+    if is_stdio(input_file) and backend in ("xsv", "parallel"):
+        raise ValueError(
+            f"Reading from stdin is not supported by the '{backend}' backend."
+        )
+    if is_stdio(output_file) and backend in ("xsv", "parallel"):
+        # The parallel backend may need to start over with the native one,
+        # but what it wrote to stdout cannot be taken back
+        raise ValueError(
+            f"Writing to stdout is not supported by the '{backend}' backend."
+        )
+
+    if head is not None and sample is not None:
+        raise ValueError("Cannot both take the head and a sample of the input.")
+    previewing = head is not None or sample is not None
+    if previewing and backend not in ("auto", "native"):
+        raise ValueError("Previews can only be made by the 'native' backend.")
+    if previewing and min(x for x in (head, sample) if x is not None) < 1:
+        raise ValueError("Previews need at least one row.")
+
+    input_size = None if is_stdio(input_file) else input_file.stat().st_size
+    if progress and progress.total_bytes is None:
+        progress.total_bytes = input_size
+
+    # The input is opened just once: the dialect and headers are peeked
+    # at from the start of the stream, that can then be split as a whole.
+    with open_input(input_file) as source:
+        dialect, input_delimiter = detect_dialect(source, input_delimiter)
+        target_headers = read_headers(source, input_delimiter, encoding)
+        indexes = resolve_columns(
+            metadata,
+            target_headers,
+            intersect,
+            ignore_missing,
+            always_include,
+            encoding,
+        )
+        # For compactness, we have to go back to 1-based column indexes, so our
+        # xsv calls do not exceed the max command len imposed by bash.
+        # Compress the IDs further...
+        SELECTIONS = compress_selection_string([x + 1 for x in indexes])
+        streaming = dialect.wide or is_sparse_selection(
+            len(target_headers), len(indexes)
+        )
+
+        if previewing:
+            preview_select(
+                source,
+                output_file,
+                indexes,
+                input_delimiter,
+                head=head,
+                sample=sample,
+                seed=seed,
+                writer_options=writer_options,
+                quoted=dialect.quoted,
+                streaming=streaming,
+            )
+            return
+
+        if backend == "auto":
+            backend, reason = choose_backend(
+                input_size,
+                SELECTIONS,
+                dialect,
+                stdio=is_stdio(input_file) or is_stdio(output_file),
+                n_columns=len(target_headers),
+                n_selected=len(indexes),
+                writer_options=writer_options,
+            )
+            log.info(f"Using the '{backend}' backend, as {reason}.")
+
+        if backend == "parallel" and (dialect.quoted or dialect.wide):
+            log.warning(
+                "The input has quotes or very wide rows, so it cannot be split in parallel. Using the 'native' backend."
+            )
+            backend = "native"
+
+        if backend == "parallel":
+            try:
+                parallel_select(
+                    input_file,
+                    output_file,
+                    indexes,
+                    input_delimiter,
+                    writer_options=writer_options,
+                    progress=progress,
+                )
+            except QuoteFoundError:
+                log.warning(
+                    "Found quotes in the input, that cannot be split in parallel. Falling back to the 'native' backend."
+                )
+                backend = "native"
+
+        if backend == "native":
+            native_select(
+                source,
+                output_file,
+                indexes,
+                input_delimiter,
+                writer_options=writer_options,
+                quoted=dialect.quoted,
+                streaming=streaming,
+                progress=progress,
+            )
+        elif backend == "xsv":
+            # We're done. We just need to pass these selections to XSV
+            selection_str = ",".join(SELECTIONS)
+            xsv_select(
+                input_file,
+                selection_str,
+                input_delimiter,
+                include_header=True,
+                output_file=output_file,
+                progress=progress,
+            )
 
     log.debug("Done!")
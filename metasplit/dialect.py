@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+import csv
+import io
+import logging
+
+from metasplit.streams import PeekableInput
+
+log = logging.getLogger(__name__)
+
+SAMPLE_SIZE = 1024 * 1024
+"""How many bytes from the start of a file are sampled to detect its dialect"""
+CANDIDATE_DELIMITERS = (",", "\t", ";", "|")
+"""The delimiters that we try to detect, in order of preference"""
+DEFAULT_ENCODING = "UTF-8"
+"""The encoding used to decode header names and metadata values"""
+PASSTHROUGH_ENCODING = "latin-1"
+"""Maps every byte to a character and back unchanged. Used when cells are
+only parsed, never compared, so they are copied byte for byte"""
+
+
+@dataclass(slots=True)
+class Dialect:
+    """What we know of the format of a csv file after sampling it"""
+
+    delimiter: str
+    """The delimiter between fields"""
+    quoted: bool
+    """Whether quote characters were found in the sample. If not, the file
+    can be split with the fast tokenizer, that ignores quoting"""
+    confident: bool
+    """Whether the delimiter splits every sampled line in the same number of
+    fields. If not, it's just our best guess"""
+    wide: bool = False
+    """Whether the first row did not fit in the sample. Such rows are better
+    tokenized field by field than held in memory as a whole"""
+
+
+def _field_counts(lines: list[bytes], delimiter: str, quoted: bool) -> list[int]:
+    if not quoted:
+        delim = delimiter.encode()
+        return [line.count(delim) + 1 for line in lines]
+    text = io.StringIO(b"\n".join(lines).decode(PASSTHROUGH_ENCODING))
+    return [len(row) for row in csv.reader(text, delimiter=delimiter) if row]
+
+
+def sniff(file: Path | PeekableInput, sample_size: int = SAMPLE_SIZE) -> Dialect:
+    """Sample the start of a csv file to detect its delimiter and quoting.
+
+    The file can also be an input that was not read yet, in which case the
+    sample is just peeked at.
+    """
+    if isinstance(file, PeekableInput):
+        sample = file.peek(sample_size + 1)
+        at_eof = len(sample) <= sample_size
+        sample = sample[:sample_size]
+        file = file.name
+    else:
+        with file.open("rb") as stream:
+            sample = stream.read(sample_size)
+            at_eof = not stream.read(1)
+
+    quoted = b'"' in sample
+    wide = not at_eof and b"\n" not in sample
+    lines = sample.split(b"\n")
+    if not at_eof and len(lines) > 1:
+        lines.pop()  # The last line was cut by the sample
+    lines = [line.rstrip(b"\r") for line in lines if line.strip()]
+
+    best, best_fields, confident = ",", 1, False
+    for delimiter in CANDIDATE_DELIMITERS:
+        counts = _field_counts(lines, delimiter, quoted)
+        if not counts or counts[0] < 2:
+            continue
+        consistent = len(lines) > 1 and min(counts) == max(counts)
+        # Consistent delimiters always win over guesses. Between two of the
+        # same kind, we keep the one that splits the header the most.
+        if (consistent, counts[0]) > (confident, best_fields):
+            best, best_fields, confident = delimiter, counts[0], consistent
+
+    if len(lines) == 1 and best_fields > 1:
+        # With just one (possibly partial) line, we have nothing to compare to
+        confident = True
+
+    log.debug(
+        f"Sniffed {file}: delimiter {best!r}, quoted: {quoted}, confident: {confident}, wide: {wide}"
+    )
+    return Dialect(delimiter=best, quoted=quoted, confident=confident, wide=wide)
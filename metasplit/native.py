@@ -0,0 +1,505 @@
+from __future__ import annotations
+
+from contextlib import nullcontext
+from itertools import chain, islice
+from operator import itemgetter
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+import csv
+import io
+import logging
+
+from metasplit.dialect import DEFAULT_ENCODING, PASSTHROUGH_ENCODING
+from metasplit.progress import Progress
+from metasplit.streams import PeekableInput, open_input
+from metasplit.writer import BlockWriter, WriterOptions
+
+log = logging.getLogger(__name__)
+
+BATCH_ROWS = 1024
+"""How many output rows are joined together before being handed to the writer"""
+READ_BUFFER_SIZE = 1024 * 1024
+"""Size of the read buffer of the input"""
+STREAM_CHUNK_SIZE = 1024 * 1024
+"""How many bytes the streaming tokenizer reads at a time"""
+SKIP_WINDOW = 4096
+"""How many bytes the streaming tokenizer looks at when skipping many unselected fields"""
+QUOTE = ord('"')
+CR = ord("\r")
+
+
+class _BufferSink:
+    """Collects output in memory, in place of a BlockWriter"""
+
+    __slots__ = ("buffer",)
+
+    def __init__(self) -> None:
+        self.buffer = bytearray()
+
+    def write(self, data: bytes) -> None:
+        self.buffer += data
+
+
+class _TextSink:
+    """Adapt a BlockWriter to the text `write` interface used by `csv.writer`.
+
+    The csv writer must end rows with '\r\n': it only quotes fields with the
+    characters of its line terminator, and a lone '\r' has to be quoted like
+    `_requote` and xsv do. Each row is written with a plain '\n' instead.
+    """
+
+    __slots__ = ("writer",)
+
+    def __init__(self, writer: BlockWriter) -> None:
+        self.writer = writer
+
+    def write(self, row: str) -> None:
+        self.writer.write(row[:-2].encode(PASSTHROUGH_ENCODING) + b"\n")
+
+
+def read_headers(
+    source: Path | PeekableInput,
+    delimiter: str = ",",
+    encoding: str = DEFAULT_ENCODING,
+) -> list[str]:
+    """Read the header line of a csv file.
+
+    If the source is an input that was not read yet, the header line is just
+    peeked at, and will be read again when the input is split.
+
+    Bytes that are not valid in the encoding are kept as surrogates, so they
+    still compare equal to the same bytes in the metadata.
+    """
+    if isinstance(source, Path):
+        with open_input(source) as stream:
+            return read_headers(stream, delimiter, encoding)
+    record = source.peek_record().decode(encoding, errors="surrogateescape")
+    return next(csv.reader(io.StringIO(record, newline=""), delimiter=delimiter), [])
+
+
+def iter_records(lines: Iterable[bytes]) -> Iterator[bytes]:
+    """Group the lines of a csv in records, with their line endings.
+
+    Newlines inside quoted fields do not end a record. Blank lines are skipped.
+    """
+    parts, quotes = [], 0
+    for line in lines:
+        parts.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            record = b"".join(parts) if len(parts) > 1 else line
+            parts, quotes = [], 0
+            if record.strip(b"\r\n"):
+                yield record
+    if parts:
+        yield b"".join(parts)
+
+
+def _getter(indexes: list[int]):
+    """Build a function that takes the items at `indexes` out of a list, as a tuple"""
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda row: (row[index],)
+    return itemgetter(*indexes)
+
+
+def _short_row(n_fields: int, indexes: list[int]) -> ValueError:
+    missing = next(i for i in indexes if i >= n_fields)
+    return ValueError(
+        f"Found a row with {n_fields} fields, but column {missing} was selected."
+    )
+
+
+def _quote_field(field: bytes) -> bytes:
+    if b"," in field:
+        return b'"' + field + b'"'
+    return field
+
+
+def _fast_select(
+    stream: BinaryIO,
+    writer: BlockWriter,
+    indexes: list[int],
+    delimiter: str,
+    progress: Optional[Progress] = None,
+) -> Optional[Iterator[bytes]]:
+    """Select columns by just splitting lines on the delimiter.
+
+    This is only correct as long as there is no quoting, so as soon as a line
+    with a quote shows up we stop and return an iterator over the remaining
+    lines (starting with the quoted one), to be parsed the slow way.
+    Returns None if the whole stream was consumed.
+    """
+    delim = delimiter.encode()
+    get = _getter(indexes)
+    # The output is always comma-delimited, so with other delimiters we have
+    # to quote the fields that happen to contain a comma
+    needs_quoting = delim != b","
+    batch = []
+
+    for line in stream:
+        if b'"' in line:
+            writer.write(b"".join(batch))
+            if progress:
+                progress.update(len(batch))
+            log.debug("Found a quote character. Switching to the csv tokenizer.")
+            return chain([line], stream)
+        line = line.rstrip(b"\r\n")
+        if not line:
+            continue
+        split = line.split(delim)
+        try:
+            fields = get(split)
+        except IndexError:
+            raise _short_row(len(split), indexes) from None
+        if needs_quoting:
+            fields = map(_quote_field, fields)
+        # A single empty field is written as "", like csv.writer does, so
+        # it's not a blank line
+        batch.append((b",".join(fields) or b'""') + b"\n")
+        if len(batch) >= BATCH_ROWS:
+            writer.write(b"".join(batch))
+            if progress:
+                progress.update(len(batch))
+            batch.clear()
+
+    writer.write(b"".join(batch))
+    if progress:
+        progress.update(len(batch))
+    return None
+
+
+def _requote(field: bytes) -> bytes:
+    """Quote a field for comma-delimited output, like `csv.writer` would"""
+    if b'"' in field:
+        return b'"' + field.replace(b'"', b'""') + b'"'
+    if b"," in field or b"\n" in field or b"\r" in field:
+        return b'"' + field + b'"'
+    return bytes(field)
+
+
+def _find_newline(buf: bytes, start: int) -> int:
+    """Find the next newline in buf, returning len(buf) if there is none"""
+    nl = buf.find(b"\n", start)
+    return len(buf) if nl == -1 else nl
+
+
+def _stream_select(
+    stream: BinaryIO,
+    writer: BlockWriter,
+    indexes: list[int],
+    delimiter: str,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    progress: Optional[Progress] = None,
+    max_rows: Optional[int] = None,
+    pick: Optional[Callable[[int], bool]] = None,
+) -> None:
+    """Select columns without ever holding a full row in memory.
+
+    The input is read in fixed-size chunks and walked one field at a time,
+    with a cursor into the sorted `indexes`. Only the fields under the cursor
+    are copied out, and once the last selected field of a row is written we
+    jump straight to the next line. Memory use depends on the chunk size and
+    on the size of the largest selected field, but never on the row width.
+
+    If `max_rows` is given, we stop reading once that many rows are written.
+
+    If `pick` is given, it is called with the number of every row (the header
+    is row 0, and blank lines are not counted) before it is read, and only
+    the rows it returns True for are written. The others are skipped like
+    the tail of a row, without copying anything. It may be called more than
+    once with the same number, if blank lines come before the row.
+    """
+    delim = delimiter.encode()
+    n_selected = len(indexes)
+
+    buf = b""
+    pos = 0
+    nl = 0  # Position of the next newline in buf, or len(buf) if there is none
+    eof = False
+
+    col = 0  # Index of the current field in the row
+    k = 0  # Cursor in indexes: the next field to select is indexes[k]
+    selecting = indexes[0] == 0
+    field = bytearray()  # The (unquoted) content of the selected field
+    quoted_len = -1  # Length of field when its closing quote was found
+    at_start = True
+    in_quotes = False
+    after_quote = False
+    empty_row = True
+    skipping = False
+    rows = 0  # Rows written since the last progress update
+    rows_left = max_rows
+    row = 0  # Number of the current row, not counting blank lines
+    keeping = pick is None or pick(row)
+    if not keeping:
+        k, selecting, skipping = n_selected, False, True
+
+    while True:
+        if pos >= len(buf):
+            if eof:
+                break
+            if progress:
+                progress.update(rows)
+                rows = 0
+            buf = stream.read(chunk_size)
+            pos = 0
+            if not buf:
+                if empty_row and col == 0 and not in_quotes:
+                    break
+                # Close the last row as if it ended with a newline
+                buf, eof = b"\n", True
+            nl = _find_newline(buf, 0)
+
+        if skipping:
+            # The rest of the row has nothing to select. Jump to the newline,
+            # unless a quote might be hiding one in a field.
+            if nl < pos:
+                nl = _find_newline(buf, pos)
+            q = buf.find(b'"', pos, nl)
+            if q != -1:
+                empty_row = False
+                if (q == pos and at_start) or (
+                    q > pos and buf.startswith(delim, q - len(delim))
+                ):
+                    # A quoted field: jump to it and parse it, as it might
+                    # hold a newline. We go back to skipping right after.
+                    pos = q
+                    at_start = True
+                    skipping = False
+                else:
+                    # A quote inside an unquoted field is just a character
+                    pos = q + 1
+                    at_start = False
+                continue
+            if empty_row and (nl - pos > 1 or (nl > pos and buf[pos] != CR)):
+                empty_row = False  # We are skipping a whole row
+            pos = nl
+            if nl < len(buf):
+                skipping = False
+            else:
+                # We might stop in the middle of a field
+                at_start = buf.endswith(delim)
+            continue
+
+        if in_quotes:
+            if after_quote:
+                after_quote = False
+                if buf[pos] == QUOTE:  # An escaped quote
+                    if selecting:
+                        field += b'"'
+                    pos += 1
+                else:
+                    in_quotes = False
+                    quoted_len = len(field)
+                continue
+            q = buf.find(b'"', pos)
+            if q == -1:
+                if selecting:
+                    field += buf[pos:]
+                pos = len(buf)
+                continue
+            if selecting:
+                field += buf[pos:q]
+            pos = q + 1
+            after_quote = True
+            continue
+
+        if at_start and not selecting and k < n_selected:
+            # Jump over runs of unselected fields by counting delimiters,
+            # which is much faster than walking them one by one
+            if nl < pos:
+                nl = _find_newline(buf, pos)
+            gap = indexes[k] - col
+            start = pos
+            width = SKIP_WINDOW
+            while gap > 1:
+                window_end = min(nl, pos + width)
+                n_delims = buf.count(delim, pos, window_end)
+                if n_delims >= gap:
+                    # Too far: shrink the window to where we expect the
+                    # field before the selected one to start
+                    width = (window_end - pos) * (gap - 1) // n_delims
+                    continue
+                if n_delims == 0 or buf.find(b'"', pos, window_end) != -1:
+                    break
+                pos = buf.rfind(delim, pos, window_end) + 1
+                col += n_delims
+                gap -= n_delims
+            if pos != start:
+                empty_row = False
+                continue
+
+        if at_start:
+            at_start = False
+            if buf[pos] == QUOTE:
+                in_quotes = True
+                empty_row = False
+                pos += 1
+                continue
+
+        # An unquoted field (or what follows a closing quote) runs up to the
+        # next delimiter or newline
+        if nl < pos:
+            nl = _find_newline(buf, pos)
+        end = buf.find(delim, pos, nl)
+        at_newline = end == -1
+        if at_newline:
+            end = nl
+            if end == len(buf):  # The field goes on in the next chunk
+                if selecting:
+                    field += buf[pos:]
+                if empty_row and buf[pos:].strip(b"\r"):
+                    empty_row = False
+                pos = end
+                continue
+        if empty_row and (not at_newline or buf[pos:end].strip(b"\r")):
+            empty_row = False
+        if selecting:
+            field += buf[pos:end]
+        pos = end + 1
+
+        if at_newline and empty_row and col == 0:
+            # Skip blank lines, and start over on the next one
+            field.clear()
+            quoted_len = -1
+            at_start = True
+            skipping = not keeping
+            continue
+
+        if selecting:
+            if at_newline and field.endswith(b"\r") and len(field) > quoted_len:
+                del field[-1:]
+            if k:
+                writer.write(b"," + _requote(field))
+            elif field or n_selected > 1:
+                writer.write(_requote(field))
+            else:
+                writer.write(b'""')  # Like csv.writer, so it's not a blank line
+            field.clear()
+            k += 1
+        col += 1
+        selecting = k < n_selected and col == indexes[k]
+        quoted_len = -1
+        at_start = True
+        empty_row = False
+
+        if at_newline:
+            if keeping:
+                if k < n_selected:
+                    raise _short_row(col, indexes)
+                writer.write(b"\n")
+                rows += 1
+                if rows_left is not None:
+                    rows_left -= 1
+                    if not rows_left:
+                        break
+            row += 1
+            col = k = 0
+            selecting = indexes[0] == 0
+            empty_row = True
+            if pick is not None:
+                keeping = pick(row)
+                if not keeping:
+                    k, selecting, skipping = n_selected, False, True
+        elif k == n_selected:
+            skipping = True
+
+
+def _csv_select(
+    lines: Iterable[bytes],
+    writer: BlockWriter,
+    indexes: list[int],
+    delimiter: str,
+    progress: Optional[Progress] = None,
+) -> None:
+    """Select columns with a full csv parser, that understands quoting.
+
+    Cells are never really decoded: lines go through latin-1, that maps each
+    byte to one character, so they come out of the csv writer unchanged
+    whatever their actual encoding.
+    """
+    get = _getter(indexes)
+    text = (line.decode(PASSTHROUGH_ENCODING) for line in lines)
+    out = csv.writer(_TextSink(writer), lineterminator="\r\n")
+    rows = 0
+    for row in csv.reader(text, delimiter=delimiter):
+        if row:
+            try:
+                out.writerow(get(row))
+            except IndexError:
+                raise _short_row(len(row), indexes) from None
+            rows += 1
+            if progress and rows == BATCH_ROWS:
+                progress.update(rows)
+                rows = 0
+    if progress:
+        progress.update(rows)
+
+
+def native_select(
+    input_file: Path | PeekableInput,
+    output_file: Path,
+    indexes: Iterable[int],
+    delimiter: str = ",",
+    writer_options: Optional[WriterOptions] = None,
+    quoted: bool = True,
+    streaming: bool = False,
+    progress: Optional[Progress] = None,
+    limit: Optional[int] = None,
+) -> None:
+    """Copy the columns at the given (0-based) indexes to a new csv file.
+
+    The input may be a path or an input that was only peeked at, and the
+    output may be '-' to write to stdout. Columns are written in file order,
+    with a comma as the output delimiter, just like `xsv select` does.
+
+    If `quoted` is False (the input was sniffed and no quotes were found),
+    lines are split with a fast tokenizer that ignores quoting. Should a
+    quote show up anyway, the rest of the file is parsed as a regular csv.
+
+    If `streaming` is True, rows are tokenized field by field and never held
+    in memory as a whole, which is what we want for extremely wide rows.
+
+    If a `progress` is given, it is updated with the rows written and the
+    input bytes read as the split goes on.
+
+    If a `limit` is given, only the header and (up to) that many rows are
+    copied, and the input is not read any further.
+    """
+    indexes = sorted(set(indexes))
+    log.debug(f"Natively selecting {len(indexes)} columns from {input_file}")
+
+    if isinstance(input_file, Path):
+        source = open_input(input_file)
+    else:
+        source = nullcontext(input_file)  # The caller will close it
+
+    with source as source, BlockWriter(output_file, writer_options) as writer:
+        stream = io.BufferedReader(source, buffer_size=READ_BUFFER_SIZE)
+        if progress:
+            progress.track(stream.tell)
+            progress.start()
+        max_rows = None if limit is None else limit + 1  # With the header
+        if streaming:
+            _stream_select(
+                stream,
+                writer,
+                indexes,
+                delimiter,
+                STREAM_CHUNK_SIZE,
+                progress,
+                max_rows,
+            )
+        else:
+            lines = stream
+            if max_rows is not None:
+                # Newlines in quoted fields must not count as rows
+                lines = islice(iter_records(stream), max_rows)
+            remainder = lines
+            if not quoted:
+                remainder = _fast_select(lines, writer, indexes, delimiter, progress)
+            if remainder is not None:
+                _csv_select(remainder, writer, indexes, delimiter, progress)
+    if progress:
+        progress.finish()
@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional
+import logging
+import os
+
+from metasplit.native import _BufferSink, _fast_select
+from metasplit.progress import Progress
+from metasplit.writer import BlockWriter, WriterOptions
+
+log = logging.getLogger(__name__)
+
+PARALLEL_CHUNK_SIZE = 64 * 1024 * 1024
+"""How many bytes of input each worker processes at a time, at most"""
+PARALLEL_MAX_IN_FLIGHT = 512 * 1024 * 1024
+"""How many bytes of input can be in flight at once, whatever the number of processes"""
+
+
+def available_cores() -> int:
+    """How many cores this process may run on, respecting affinity masks"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class QuoteFoundError(Exception):
+    """Raised when a chunk turns out to have quotes, so it cannot be split in parallel"""
+
+
+def _lines_between(stream, start: int, end: int) -> Iterator[bytes]:
+    """Yield the lines of the stream that start in the [start, end) byte range"""
+    if start:
+        # Skip the line that started in the previous chunk
+        stream.seek(start - 1)
+        stream.readline()
+    position = stream.tell()
+    while position < end and (line := stream.readline()):
+        position += len(line)
+        yield line
+
+
+def _select_chunk(
+    task: tuple[Path, int, int, list[int], str]
+) -> Optional[tuple[bytes, int]]:
+    """Select the columns of a chunk of the input.
+
+    Returns the output and how many rows it has, or None if a quote was found.
+    """
+    path, start, end, indexes, delimiter = task
+    sink = _BufferSink()
+    with path.open("rb") as stream:
+        lines = _lines_between(stream, start, end)
+        if _fast_select(lines, sink, indexes, delimiter) is not None:
+            return None
+    return bytes(sink.buffer), sink.buffer.count(b"\n")
+
+
+def parallel_select(
+    input_file: Path,
+    output_file: Path,
+    indexes: list[int],
+    delimiter: str = ",",
+    writer_options: Optional[WriterOptions] = None,
+    processes: Optional[int] = None,
+    progress: Optional[Progress] = None,
+) -> None:
+    """Copy the columns at the given (0-based) indexes to a new csv file, using
+    many processes.
+
+    The input is cut in chunks at line boundaries, and each chunk is split by
+    the fast tokenizer in a worker process. This is only correct for inputs
+    without quotes: if a worker finds one, QuoteFoundError is raised and the
+    output is left untouched.
+    """
+    indexes = sorted(set(indexes))
+    processes = processes or available_cores()
+    size = input_file.stat().st_size
+    # Every process has two chunks in flight, so it always has one to work on.
+    # With many processes, chunks get smaller so that the results waiting to
+    # be written (about as large as their chunks, at most) stay within a fixed
+    # budget.
+    max_pending = processes * 2
+    chunk_size = max(1, min(PARALLEL_CHUNK_SIZE, PARALLEL_MAX_IN_FLIGHT // max_pending))
+    tasks = [
+        (input_file, start, min(start + chunk_size, size), indexes, delimiter)
+        for start in range(0, size, chunk_size)
+    ]
+    log.debug(
+        f"Selecting {len(indexes)} columns from {input_file} in {len(tasks)} chunks with {processes} processes"
+    )
+
+    done = 0
+    if progress:
+        progress.track(lambda: done)
+        progress.start()
+
+    with (
+        ProcessPoolExecutor(max_workers=processes) as pool,
+        BlockWriter(output_file, writer_options) as writer,
+    ):
+        # Chunks are written in order, and at most `max_pending` are in
+        # flight at once so that memory stays bounded
+        pending = deque()
+        tasks = iter(tasks)
+        for task in tasks:
+            pending.append((task[2], pool.submit(_select_chunk, task)))
+            if len(pending) >= max_pending:
+                break
+        while pending:
+            end, future = pending.popleft()
+            result = future.result()
+            if result is None:
+                for _, other in pending:
+                    other.cancel()
+                raise QuoteFoundError(f"Found a quote in {input_file}")
+            output, rows = result
+            writer.write(output)
+            done = end
+            if progress:
+                progress.update(rows)
+            if (task := next(tasks, None)) is not None:
+                pending.append((task[2], pool.submit(_select_chunk, task)))
+
+    if progress:
+        progress.finish()
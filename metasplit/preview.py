@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+from collections import deque
+from functools import partial
+from itertools import islice
+from math import exp, floor, log as ln
+from operator import itemgetter
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, Optional
+import io
+import logging
+import random
+
+from metasplit import native
+from metasplit.native import (
+    READ_BUFFER_SIZE,
+    _BufferSink,
+    _csv_select,
+    _stream_select,
+    iter_records,
+    native_select,
+)
+from metasplit.streams import PeekableInput
+from metasplit.writer import BlockWriter, WriterOptions
+
+log = logging.getLogger(__name__)
+
+
+def _uniform(rng: random.Random) -> float:
+    """A random number in the open (0, 1) interval, so we can take its log"""
+    while (x := rng.random()) == 0.0:
+        pass
+    return x
+
+
+class _Reservoir:
+    """A uniform random sample of `n` numbered items, built in a single pass.
+
+    This is Li's "Algorithm L" reservoir sampling: which item replaces one in
+    the sample next is drawn in advance (`next_index`), so the items before it
+    can be skipped without ever being looked at.
+    """
+
+    __slots__ = ("n", "rng", "items", "next_index", "_weight")
+
+    def __init__(self, n: int, rng: random.Random) -> None:
+        self.n = n
+        """The size of the sample"""
+        self.rng = rng
+        """The random number generator used to draw the sample"""
+        self.items: list[tuple[int, bytes]] = []
+        """The sampled items, with their index"""
+        self.next_index = 0
+        """The index of the next item to add to the sample"""
+        self._weight = 1.0
+
+    def add(self, index: int, item: bytes) -> None:
+        """Add the item at `next_index` to the sample, and draw the next one"""
+        if len(self.items) < self.n:
+            self.items.append((index, item))
+            if len(self.items) < self.n:
+                self.next_index = index + 1
+                return
+            self._weight = exp(ln(_uniform(self.rng)) / self.n)
+        else:
+            self.items[self.rng.randrange(self.n)] = (index, item)
+            self._weight *= exp(ln(_uniform(self.rng)) / self.n)
+        skip = floor(ln(_uniform(self.rng)) / ln(1 - self._weight))
+        self.next_index = index + skip + 1
+
+    def sample(self) -> list[bytes]:
+        """The sampled items, in the order they came in"""
+        return [item for _, item in sorted(self.items, key=itemgetter(0))]
+
+
+def sample_records(
+    records: Iterator[bytes],
+    n: int,
+    rng: Optional[random.Random] = None,
+    keep: Optional[Callable[[bytes], bytes]] = None,
+) -> list[bytes]:
+    """Take a uniform random sample of `n` records, in a single pass.
+
+    Records that are not picked are never looked at twice. The sample keeps
+    the input order.
+
+    If given, records are passed through `keep` as they enter the sample, and
+    what it returns is held in their place.
+    """
+    reservoir = _Reservoir(n, rng or random.Random())
+    keep = keep or (lambda record: record)
+    index = 0
+    while True:
+        # Consume the skipped records at C speed
+        deque(islice(records, reservoir.next_index - index), maxlen=0)
+        record = next(records, None)
+        if record is None:
+            break
+        index = reservoir.next_index
+        reservoir.add(index, keep(record))
+        index += 1
+
+    return reservoir.sample()
+
+
+class _StreamSampler:
+    """Tells the streaming tokenizer which rows to read, to sample them.
+
+    The header (row 0) is always picked. The selected columns of a picked row
+    are written to `sink`, and are moved to the reservoir when the tokenizer
+    asks about a later row, or when `collect` is called at the end.
+    """
+
+    __slots__ = ("reservoir", "sink", "header", "_picked")
+
+    def __init__(self, reservoir: _Reservoir) -> None:
+        self.reservoir = reservoir
+        """The sample of the rows after the header"""
+        self.sink = _BufferSink()
+        """Where the tokenizer writes the picked rows"""
+        self.header = b""
+        """The selected columns of the header"""
+        self._picked = 0
+
+    def collect(self) -> None:
+        """Move the last picked row out of the sink"""
+        if not self.sink.buffer:
+            return
+        row = bytes(self.sink.buffer)
+        self.sink.buffer.clear()
+        if self._picked == 0:
+            self.header = row
+        else:
+            self.reservoir.add(self._picked - 1, row)
+
+    def __call__(self, row: int) -> bool:
+        self.collect()
+        if row == 0 or row - 1 == self.reservoir.next_index:
+            self._picked = row
+            return True
+        return False
+
+
+def _select_record(record: bytes, indexes: list[int], delimiter: str) -> bytes:
+    """Select the columns of a single record, and return them as a csv line"""
+    sink = _BufferSink()
+    _csv_select([record], sink, indexes, delimiter)
+    return bytes(sink.buffer)
+
+
+def preview_select(
+    source: PeekableInput,
+    output_file: Path,
+    indexes: Iterable[int],
+    delimiter: str = ",",
+    head: Optional[int] = None,
+    sample: Optional[int] = None,
+    seed: Optional[int] = None,
+    writer_options: Optional[WriterOptions] = None,
+    quoted: bool = True,
+    streaming: bool = False,
+) -> None:
+    """Copy the columns at the given (0-based) indexes of just some rows to a
+    new csv file: the first `head` ones, or `sample` random ones.
+
+    Taking the head stops reading the input as soon as the rows are found.
+    Sampling needs to go through the whole input once, but only holds the
+    selected columns of the sampled rows in memory. With `streaming`, the rows
+    that are not sampled are skipped without being read into memory at all. The header is always kept.
+    """
+    assert (head is None) != (sample is None), "Give exactly one of head or sample"
+
+    if head is not None:
+        native_select(
+            source,
+            output_file,
+            indexes,
+            delimiter,
+            writer_options=writer_options,
+            quoted=quoted,
+            streaming=streaming,
+            limit=head,
+        )
+        return
+
+    indexes = sorted(set(indexes))
+    stream = io.BufferedReader(source, buffer_size=READ_BUFFER_SIZE)
+    rng = random.Random(seed)
+    if streaming:
+        # Rows may be too wide to hold, so let the tokenizer skip the ones
+        # that are not sampled, and copy just the columns of the others.
+        sampler = _StreamSampler(_Reservoir(sample, rng))
+        _stream_select(
+            stream,
+            sampler.sink,
+            indexes,
+            delimiter,
+            native.STREAM_CHUNK_SIZE,
+            pick=sampler,
+        )
+        sampler.collect()
+        header = sampler.header
+        rows = sampler.reservoir.sample()
+    else:
+        records = iter_records(stream)
+        select = partial(_select_record, indexes=indexes, delimiter=delimiter)
+        header = select(next(records, b""))
+        rows = sample_records(records, sample, rng, keep=select)
+    log.info(f"Previewing {len(rows)} rows of {source.name}")
+
+    with BlockWriter(output_file, writer_options) as writer:
+        writer.write(header)
+        for row in rows:
+            writer.write(row)
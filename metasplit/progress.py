@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, Optional
+import json
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+DEFAULT_INTERVAL = 10.0
+"""Default number of seconds between two progress reports"""
+
+
+def _human_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB", "TB"):
+        if abs(n) < 1024 or unit == "TB":
+            return f"{n:.1f} {unit}"
+        n /= 1024
+
+
+class Progress:
+    """Tracks how far along a split is, and periodically reports it.
+
+    Reports go to the log (so, to stderr) and, optionally, are appended as
+    JSON lines to a progress file. Calling `update` is cheap: the clock is
+    read on every call, but the input position is only looked up and a
+    report only built once every `interval` seconds.
+    """
+
+    __slots__ = (
+        "total_bytes",
+        "interval",
+        "file",
+        "bytes_done",
+        "rows_done",
+        "_position",
+        "_start",
+        "_next_report",
+    )
+
+    def __init__(
+        self,
+        total_bytes: Optional[int] = None,
+        interval: float = DEFAULT_INTERVAL,
+        file: Optional[Path] = None,
+    ) -> None:
+        # The size of the input, used to compute the ETA. None if unknown
+        self.total_bytes = total_bytes
+        self.interval = interval
+        # If set, reports are also appended to this file as JSON lines
+        self.file = file
+        self.bytes_done = 0
+        # How many rows were processed, or None if it cannot be known
+        self.rows_done: Optional[int] = 0
+        self._position: Optional[Callable[[], int]] = None
+        self._start = time.monotonic()
+        self._next_report = self._start + interval
+
+    def track(self, position: Callable[[], int]) -> None:
+        """Set the function used to know how many input bytes were read so far"""
+        self._position = position
+
+    def start(self) -> None:
+        """Reset the clock, to be called right before the work starts"""
+        self.bytes_done = 0
+        self.rows_done = 0
+        self._start = time.monotonic()
+        self._next_report = self._start + self.interval
+        if self.file:
+            self.file.write_text("")
+
+    def update(self, rows: int = 0) -> None:
+        """Add some processed rows, and report if it's time to"""
+        if rows and self.rows_done is not None:
+            self.rows_done += rows
+        now = time.monotonic()
+        if now >= self._next_report:
+            self._next_report = now + self.interval
+            if self._position is not None:
+                self.bytes_done = self._position()
+            self.report(now)
+
+    def finish(self) -> None:
+        """Report one last time, when the work is done"""
+        if self.total_bytes is not None:
+            self.bytes_done = self.total_bytes
+        self.report(time.monotonic(), done=True)
+
+    def status(self, now: Optional[float] = None) -> dict:
+        now = time.monotonic() if now is None else now
+        elapsed = max(now - self._start, 1e-9)
+        bytes_per_s = self.bytes_done / elapsed
+        status = {
+            "elapsed_s": round(elapsed, 3),
+            "bytes": self.bytes_done,
+            "total_bytes": self.total_bytes,
+            "rows": self.rows_done,
+            "mb_per_s": round(bytes_per_s / 1024**2, 3),
+            "rows_per_s": None,
+            "fraction": None,
+            "eta_s": None,
+        }
+        if self.rows_done is not None:
+            status["rows_per_s"] = round(self.rows_done / elapsed, 3)
+        if self.total_bytes:
+            status["fraction"] = round(min(self.bytes_done / self.total_bytes, 1), 4)
+            if bytes_per_s > 0:
+                remaining = max(self.total_bytes - self.bytes_done, 0)
+                status["eta_s"] = round(remaining / bytes_per_s, 1)
+        return status
+
+    def report(self, now: Optional[float] = None, done: bool = False) -> None:
+        status = self.status(now)
+
+        message = f"Processed {_human_bytes(status['bytes'])}"
+        if status["fraction"] is not None:
+            message += f" ({status['fraction']:.1%})"
+        if status["rows"] is not None:
+            message += f", {status['rows']:,} rows"
+        message += f" - {status['mb_per_s']:.1f} MB/s"
+        if status["rows_per_s"] is not None:
+            message += f", {status['rows_per_s']:,.0f} rows/s"
+        if done:
+            message += f" - done in {timedelta(seconds=round(status['elapsed_s']))}"
+        elif status["eta_s"] is not None:
+            message += f" - ETA {timedelta(seconds=round(status['eta_s']))}"
+        log.info(message)
+
+        if self.file:
+            status["done"] = done
+            with self.file.open("a") as stream:
+                stream.write(json.dumps(status) + "\n")
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+from itertools import islice
+from pathlib import Path
+from typing import Optional, TYPE_CHECKING
+import csv
+import logging
+import os
+import sqlite3
+import tempfile
+
+from metasplit.dialect import DEFAULT_ENCODING, sniff
+from metasplit.errors import NoSelectionError
+from metasplit.writer import _new_file_mode
+
+if TYPE_CHECKING:
+    from metasplit.core import MetaPath
+
+log = logging.getLogger(__name__)
+
+SQLITE_SUFFIXES = (".sqlite", ".sqlite3")
+"""Metadata files with these suffixes are read as SQLite stores instead of csvs"""
+TABLE = "metadata"
+"""The name of the table that holds the metadata in the store"""
+INSERT_BATCH_SIZE = 10_000
+"""How many rows are inserted in the store at a time"""
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a column name so it can be safely used in a SQL statement"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def is_store(file: Path) -> bool:
+    return file.suffix in SQLITE_SUFFIXES
+
+
+def import_metadata(
+    csv_file: Path,
+    store_file: Path,
+    index_columns: Optional[list[str]] = None,
+    delimiter: Optional[str] = None,
+    encoding: str = DEFAULT_ENCODING,
+) -> None:
+    """Import a metadata csv in a SQLite store, replacing it if it exists.
+
+    Args:
+        csv_file (Path): The metadata csv to import.
+        store_file (Path): The SQLite file to create.
+        index_columns (Optional[list[str]]): The columns to index, which should
+            be the ones that are used in selections. If None, every column is
+            indexed.
+        delimiter (Optional[str]): The delimiter of the csv. Detected
+            automatically if not given.
+        encoding (str): The encoding of the csv. Values are stored as text,
+            so they must be valid in this encoding.
+    """
+    delimiter = delimiter or sniff(csv_file).delimiter
+
+    # The store is built next to its final place, and only moved there once
+    # complete, so a failed import never leaves a half-built store behind
+    fd, tmp_name = tempfile.mkstemp(
+        dir=store_file.parent, prefix=f".{store_file.name}.", suffix=".tmp"
+    )
+    os.chmod(fd, _new_file_mode(store_file))
+    os.close(fd)
+    tmp_file = Path(tmp_name)
+    try:
+        n_rows, index_columns = _build_store(
+            csv_file, tmp_file, index_columns, delimiter, encoding
+        )
+        os.replace(tmp_file, store_file)
+    finally:
+        tmp_file.unlink(missing_ok=True)
+
+    log.info(
+        f"Imported {n_rows} rows from {csv_file} to {store_file}, indexing {len(index_columns)} columns."
+    )
+
+
+def _build_store(
+    csv_file: Path,
+    store_file: Path,
+    index_columns: Optional[list[str]],
+    delimiter: str,
+    encoding: str,
+) -> tuple[int, list[str]]:
+    """Fill an empty store with the metadata. Returns how many rows were
+    imported, and which columns were indexed."""
+    with (
+        csv_file.open("r", newline="", encoding=encoding) as stream,
+        sqlite3.connect(store_file) as connection,
+    ):
+        reader = csv.reader(stream, delimiter=delimiter)
+        headers = next(reader)
+        index_columns = headers if index_columns is None else index_columns
+        for column in index_columns:
+            assert (
+                column in headers
+            ), f"Cannot index column {column}, as it is not in the metadata headers ({headers})"
+
+        columns = ", ".join(f"{quote_identifier(x)} TEXT NOT NULL" for x in headers)
+        connection.execute(f"CREATE TABLE {TABLE} ({columns})")
+
+        def checked_rows():
+            for row in reader:
+                if not row:
+                    continue  # Skip blank lines, like xsv does
+                if len(row) != len(headers):
+                    raise ValueError(
+                        f"Line {reader.line_num} of {csv_file} has {len(row)} fields, but the headers have {len(headers)}."
+                    )
+                yield row
+
+        insert = f"INSERT INTO {TABLE} VALUES ({', '.join('?' * len(headers))})"
+        n_rows = 0
+        rows = checked_rows()
+        while batch := list(islice(rows, INSERT_BATCH_SIZE)):
+            connection.executemany(insert, batch)
+            n_rows += len(batch)
+
+        # Indexes are much faster to build after the data is in
+        for i, column in enumerate(index_columns):
+            connection.execute(
+                f"CREATE INDEX idx_{i} ON {TABLE} ({quote_identifier(column)})"
+            )
+        connection.execute("ANALYZE")
+
+    connection.close()
+    return n_rows, index_columns
+
+
+def select_store_ids(meta: MetaPath) -> list[str]:
+    """Select the IDs of a MetaPath that points to a SQLite store.
+
+    The chain of selections is translated to a single query, so that lookups
+    on the indexed columns never need to scan the whole table.
+
+    Raises:
+        NoSelectionError: If any selection matches no values
+    """
+    # Imported here, as the core imports this module
+    from metasplit.core import SelectionSign, UnionSign
+
+    with sqlite3.connect(f"{meta.file.as_uri()}?mode=ro", uri=True) as connection:
+        headers = [x[1] for x in connection.execute(f"PRAGMA table_info({TABLE})")]
+        log.debug(f"Processing store {meta.file} - found {len(headers)} headers.")
+        assert (
+            meta.selection_var in headers
+        ), f"Variable {meta.selection_var} not found in metadata headers ({headers})"
+
+        condition, parameters = None, []
+        for sel in meta.selections:
+            assert (
+                sel.filter_variable in headers
+            ), f"Variable {sel.filter_variable} not found in metadata headers ({headers})"
+
+            # Just like with csvs, selections that match nothing are errors
+            # even if they are negative
+            column = quote_identifier(sel.filter_variable)
+            placeholders = ", ".join("?" * len(sel.filter_values))
+            found = connection.execute(
+                f"SELECT 1 FROM {TABLE} WHERE {column} IN ({placeholders}) LIMIT 1",
+                sel.filter_values,
+            ).fetchone()
+            if not found:
+                raise NoSelectionError(
+                    f"Variable {sel.filter_variable} has no selection in {sel.filter_values}"
+                )
+
+            # Selections are applied left to right, so we nest them
+            operator = "NOT IN" if sel.sign is SelectionSign.NOT_EQUAL_TO else "IN"
+            sql = f"{column} {operator} ({placeholders})"
+            if condition is None:
+                condition = sql
+            else:
+                joiner = "AND" if sel.union is UnionSign.NEGATIVE else "OR"
+                condition = f"({condition}) {joiner} {sql}"
+            parameters.extend(sel.filter_values)
+
+        query = f"SELECT {quote_identifier(meta.selection_var)} FROM {TABLE} WHERE {condition} ORDER BY rowid"
+        log.debug(f"Querying store with: {query}")
+        ids = [x[0] for x in connection.execute(query, parameters)]
+
+    connection.close()
+    log.debug(f"Selected {len(ids)} ids from store")
+    return ids
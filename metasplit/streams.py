@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import BinaryIO
+import io
+import sys
+
+STDIO = "-"
+"""The path that stands for stdin (as input) or stdout (as output)"""
+
+
+def is_stdio(path: Path) -> bool:
+    return str(path) == STDIO
+
+
+class PeekableInput(io.RawIOBase):
+    """A binary input that can be looked into before being read.
+
+    What is peeked at is kept in memory and served again once the stream is
+    read, so the dialect and the headers can be taken from the start of the
+    input even if it's a pipe that can only be read once.
+    """
+
+    def __init__(self, raw: BinaryIO, name: str = "input") -> None:
+        self._raw = raw
+        self._prefix = bytearray()
+        self._served = 0  # How much of the prefix was already read
+        self._reading = False
+        self._position = 0
+        self._exhausted = False
+        self.name = name
+
+    @property
+    def exhausted(self) -> bool:
+        """Whether the whole input fits in what was peeked at"""
+        return self._exhausted
+
+    def _fill(self, size: int) -> None:
+        while len(self._prefix) < size and not self._exhausted:
+            chunk = self._raw.read(size - len(self._prefix))
+            if not chunk:
+                self._exhausted = True
+            self._prefix += chunk
+
+    def peek(self, size: int) -> bytes:
+        """Look at (up to) the first `size` bytes of the input"""
+        if self._reading:
+            raise io.UnsupportedOperation("Cannot peek after reading has started")
+        self._fill(size)
+        return bytes(self._prefix[:size])
+
+    def peek_record(self, chunk_size: int = 1024 * 1024) -> bytes:
+        """Look at the first record of the input, however long it is.
+
+        Newlines inside a quoted field do not end the record.
+        """
+        start = 0
+        while True:
+            nl = self._prefix.find(b"\n", start)
+            if nl == -1:
+                if self._exhausted:
+                    return self.peek(len(self._prefix))
+                start = len(self._prefix)
+                self._fill(len(self._prefix) + chunk_size)
+            elif self._prefix.count(b'"', 0, nl) % 2 == 0:
+                return self.peek(nl + 1)
+            else:
+                start = nl + 1  # This newline is inside quotes
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        self._reading = True
+        if self._served < len(self._prefix):
+            n = min(len(buffer), len(self._prefix) - self._served)
+            buffer[:n] = self._prefix[self._served : self._served + n]
+            self._served += n
+            if self._served == len(self._prefix):
+                # Everything peeked at was read, so we can let it go
+                self._prefix = bytearray()
+                self._served = 0
+        else:
+            n = self._raw.readinto(buffer)
+        self._position += n
+        return n
+
+    def tell(self) -> int:
+        return self._position
+
+    def close(self) -> None:
+        if self._raw is not sys.stdin.buffer:
+            self._raw.close()
+        super().close()
+
+
+def open_input(path: Path) -> PeekableInput:
+    """Open a file (or stdin, if the path is '-') to be peeked at and then read"""
+    if is_stdio(path):
+        return PeekableInput(sys.stdin.buffer, name="<stdin>")
+    return PeekableInput(path.open("rb", buffering=0), name=str(path))
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Optional
+import logging
+import os
+import queue
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import zlib
+
+from metasplit.streams import is_stdio
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 8 * 1024 * 1024
+"""Default size (in bytes) of the blocks handed to the filesystem"""
+COMPRESSIONS = ("bgzf", "zstd")
+"""The supported output compression formats"""
+
+BGZF_BLOCK_SIZE = 0xFF00
+"""Max uncompressed size of a BGZF block, so that its compressed size fits in 64KiB"""
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+"""The empty block that marks the end of a BGZF file"""
+
+
+@dataclass(slots=True)
+class WriterOptions:
+    """How the output of a split should be written to disk"""
+
+    block_size: int = DEFAULT_BLOCK_SIZE
+    """Size of the blocks (in bytes) written to the output file"""
+    threaded: bool = False
+    """Write blocks from a dedicated thread, so that parsing and writing overlap"""
+    compression: Optional[str] = None
+    """Compress the output with one of COMPRESSIONS, or None for plain text"""
+    compression_threads: Optional[int] = None
+    """How many threads compress blocks in parallel. Defaults to the number of cores"""
+    compression_level: int = 6
+    """The compression level passed to the compressor"""
+    fsync: bool = False
+    """If set, fsync the output file before moving it into place"""
+
+
+def bgzf_compress(data: bytes, level: int = 6) -> bytes:
+    """Compress data to one or more BGZF blocks.
+
+    Every block is an independent gzip member carrying its own size, so the
+    output can be read by any gzip reader and seeked into by BGZF-aware tools.
+    """
+    blocks = []
+    for start in range(0, len(data), BGZF_BLOCK_SIZE):
+        chunk = data[start : start + BGZF_BLOCK_SIZE]
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+        deflated = compressor.compress(chunk) + compressor.flush()
+        header = struct.pack(
+            "<4BI2BH2BHH",
+            0x1F, 0x8B, 8, 4,  # gzip magic, deflate, FEXTRA
+            0,  # mtime
+            0, 0xFF,  # xfl, os
+            6,  # xlen
+            ord("B"), ord("C"), 2,  # BGZF subfield
+            len(deflated) + 25,  # total block size - 1
+        )  # fmt: skip
+        footer = struct.pack("<II", zlib.crc32(chunk), len(chunk))
+        blocks.append(header + deflated + footer)
+    return b"".join(blocks)
+
+
+def _zstd_compressor(level: int) -> Callable[[bytes], bytes]:
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "zstd compression needs the 'zstandard' package. Install it with `pip install metasplit[zstd]`."
+        ) from e
+    # ZstdCompressor objects are not thread-safe, so every compression thread
+    # gets its own
+    local = threading.local()
+
+    def compress(block: bytes) -> bytes:
+        compressor = getattr(local, "compressor", None)
+        if compressor is None:
+            # Each block is compressed to an independent frame, so the output
+            # stays seekable at block boundaries.
+            compressor = local.compressor = zstandard.ZstdCompressor(
+                level=level, write_content_size=True
+            )
+        return compressor.compress(block)
+
+    return compress
+
+
+def _new_file_mode(path: Path) -> int:
+    """The permissions the output should have: those of the file it replaces,
+    or the ones `open` would give a new file"""
+    try:
+        return stat.S_IMODE(path.stat().st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+class BlockWriter:
+    """A buffered writer that hands large blocks to the filesystem.
+
+    If the target is a regular file (or does not exist yet), data is written
+    to a temporary file next to it, and moved into place only when the writer
+    is closed successfully, so readers never see a partial output. Blocks can
+    optionally be compressed in parallel, and written by a dedicated thread.
+
+    Use it as a context manager: if the block raises, the temporary file is
+    removed and the target is left untouched.
+
+    Anything else (a FIFO, a device, or a file in a directory we cannot
+    create files in) is written to directly, as is stdout if the path is '-'.
+    Symlinks are followed, so the file they point to is the one replaced.
+    """
+
+    def __init__(self, path: Path, options: Optional[WriterOptions] = None) -> None:
+        self.path = Path(path)
+        self.options = options or WriterOptions()
+
+        if self.options.block_size < 1:
+            raise ValueError(f"Invalid block size {self.options.block_size}")
+        if self.options.compression not in (None, *COMPRESSIONS):
+            raise ValueError(
+                f"Unknown compression {self.options.compression}. Valid compressions are {COMPRESSIONS}"
+            )
+
+        self._buffer = bytearray()
+        self._pending: deque[Future] = deque()
+        self._compress = None
+        self._pool = None
+        if self.options.compression == "bgzf":
+            level = self.options.compression_level
+            self._compress = lambda block: bgzf_compress(block, level)
+        elif self.options.compression == "zstd":
+            self._compress = _zstd_compressor(self.options.compression_level)
+        workers = self.options.compression_threads or os.cpu_count() or 1
+        if self._compress:
+            self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._max_pending = workers * 2
+
+        # Buffered files always write blocks in full, even when the
+        # filesystem takes them in pieces
+        self._tmp_path = None
+        self._target = None
+        if is_stdio(self.path):
+            self._file = sys.stdout.buffer
+        else:
+            self._target = Path(os.path.realpath(self.path))
+            if not self._target.exists() or self._target.is_file():
+                self._tmp_path = self._make_tmp(self._target)
+            if self._tmp_path is None:
+                self._file = self._target.open("wb")
+            else:
+                self._file = self._tmp_path.open("wb")
+
+        self._queue = None
+        self._thread = None
+        self._thread_error: Optional[BaseException] = None
+        if self.options.threaded:
+            self._queue = queue.Queue(maxsize=4)
+            self._thread = threading.Thread(
+                target=self._write_loop, name="metasplit-writer", daemon=True
+            )
+            self._thread.start()
+
+        self.bytes_written = 0
+        self.closed = False
+        log.debug(f"Writing to {self.path} through {self._tmp_path}")
+
+    @staticmethod
+    def _make_tmp(target: Path) -> Optional[Path]:
+        """Make an empty temporary file to write in place of the target, or
+        return None if the target's directory does not let us"""
+        try:
+            fd, tmp_name = tempfile.mkstemp(
+                dir=target.parent, prefix=f".{target.name}.", suffix=".tmp"
+            )
+        except PermissionError:
+            log.debug(f"Cannot make a temporary file next to {target}")
+            return None
+        # mkstemp makes files only the owner can read
+        os.chmod(fd, _new_file_mode(target))
+        os.close(fd)
+        return Path(tmp_name)
+
+    def _write_loop(self) -> None:
+        while (block := self._queue.get()) is not None:
+            if self._thread_error is not None:
+                continue  # Drain the queue so the producer is never stuck
+            try:
+                self._file.write(block)
+            except BaseException as e:
+                self._thread_error = e
+
+    def _check_thread(self) -> None:
+        if self._thread_error is not None:
+            raise self._thread_error
+
+    def _sink(self, block: bytes) -> None:
+        self.bytes_written += len(block)
+        if self._queue is not None:
+            self._check_thread()
+            self._queue.put(block)
+        else:
+            self._file.write(block)
+
+    def _emit(self, block: bytes) -> None:
+        if not self._pool:
+            self._sink(block)
+            return
+        self._pending.append(self._pool.submit(self._compress, block))
+        # Compressed blocks are written in order, and we keep only a few of
+        # them in flight so memory stays bounded
+        while len(self._pending) > self._max_pending:
+            self._sink(self._pending.popleft().result())
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        block_size = self.options.block_size
+        if len(self._buffer) >= block_size:
+            view = memoryview(self._buffer)
+            full = len(self._buffer) - len(self._buffer) % block_size
+            for start in range(0, full, block_size):
+                self._emit(bytes(view[start : start + block_size]))
+            view.release()
+            del self._buffer[:full]
+
+    def _shutdown(self) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+        if self._target is None:
+            self._file.flush()  # Never close stdout
+        else:
+            self._file.close()
+
+    def close(self) -> None:
+        """Flush everything and atomically move the output into place"""
+        if self.closed:
+            return
+        try:
+            if self._buffer:
+                self._emit(bytes(self._buffer))
+                self._buffer.clear()
+            while self._pending:
+                self._sink(self._pending.popleft().result())
+            if self.options.compression == "bgzf":
+                self._sink(BGZF_EOF)
+            if self._thread is not None:
+                self._queue.put(None)
+                self._thread.join()
+                self._thread = None
+                self._check_thread()
+            if self.options.fsync and self._target is not None:
+                self._file.flush()
+                if self._tmp_path is not None or self._target.is_file():
+                    os.fsync(self._file.fileno())
+        except BaseException:
+            self.abort()
+            raise
+        self._shutdown()
+        if self._tmp_path is not None:
+            os.replace(self._tmp_path, self._target)
+        self.closed = True
+        log.debug(f"Wrote {self.bytes_written} bytes to {self.path}")
+
+    def abort(self) -> None:
+        """Throw away everything written so far, leaving the target untouched"""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._shutdown()
+        finally:
+            if self._tmp_path is not None:
+                self._tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> BlockWriter:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
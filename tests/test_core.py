@@ -107,6 +107,15 @@ def test_exec():
     assert core.exec(["echo", "hello\nthere. How\nare you??"]) == "hello\nthere. How\nare you??"
 
 
+def test_xsv_iter_column(test_matrix_data):
+    values = core.xsv_iter_column(test_matrix_data, var="col3")
+    assert list(values) == ["alpha", "beta", "alpha", "beta", "alpha", "beta"]
+    # Stopping early must not leave xsv hanging
+    values = core.xsv_iter_column(test_matrix_data, var="col3")
+    assert next(values) == "alpha"
+    values.close()
+
+
 def test_xsv_select(test_matrix_data):
     assert core.xsv_select(
         test_matrix_data,
@@ -145,3 +154,45 @@ def test_indexes_of():
 
 def test_invert_index():
     assert core.invert_index(len(list("abcdef")), [0, 2, 5]) == [1, 3, 4]
+
+
+def test_encoded_column():
+    column = core.EncodedColumn(["alpha", "beta", "alpha", "beta", "alpha", "gamma"])
+    assert column.levels == ["alpha", "beta", "gamma"]
+    assert list(column.codes) == [0, 1, 0, 1, 0, 2]
+    assert column.mask_of(["alpha", "gamma"]) == bytearray([1, 0, 1, 0, 1, 1])
+
+
+def test_masks():
+    a = bytearray([1, 0, 1, 0])
+    b = bytearray([1, 1, 0, 0])
+    assert core.mask_or(a, b) == bytearray([1, 1, 1, 0])
+    assert core.mask_and(a, b) == bytearray([1, 0, 0, 0])
+    assert core.mask_invert(a) == bytearray([0, 1, 0, 1])
+
+
+def test_choose_backend():
+    from metasplit.dialect import Dialect
+    from metasplit.writer import WriterOptions
+
+    plain = Dialect(delimiter=",", quoted=False, confident=True)
+    quoted = Dialect(delimiter=",", quoted=True, confident=True)
+    wide = Dialect(delimiter=",", quoted=False, confident=True, wide=True)
+    big = 10 * core.SMALL_INPUT_SIZE
+    selection = ["1-10"]
+
+    def choose(size, dialect, selection=selection, stdio=False, **kwargs):
+        kwargs = {"cores": 8, "xsv_available": True} | kwargs
+        return core.choose_backend(size, selection, dialect, stdio, **kwargs)[0]
+
+    assert choose(None, plain, stdio=True) == "native"
+    assert choose(big, wide) == "native"
+    assert choose(1024, plain) == "native"
+    assert choose(big, plain) == "parallel"
+    assert choose(big, plain, cores=1) == "xsv"
+    assert choose(big, quoted) == "xsv"
+    assert choose(big, quoted, xsv_available=False) == "native"
+    assert choose(big, quoted, writer_options=WriterOptions()) == "native"
+    assert choose(big, quoted, selection=["1"] * (core.MAX_XSV_RANGES + 1)) == "native"
+    assert choose(big, plain, n_columns=100_000, n_selected=10) == "native"
+    assert choose(big, plain, n_columns=100_000, n_selected=50_000) == "parallel"
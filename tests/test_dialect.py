@@ -0,0 +1,38 @@
+from metasplit.dialect import sniff
+from tests.fixtures import test_matrix_data, test_tsv_data, test_selection_data
+
+
+def test_sniff_csv(test_matrix_data):
+    dialect = sniff(test_matrix_data)
+    assert dialect.delimiter == ","
+    assert dialect.quoted
+    assert dialect.confident
+
+
+def test_sniff_tsv(test_tsv_data):
+    dialect = sniff(test_tsv_data)
+    assert dialect.delimiter == "\t"
+    assert dialect.quoted
+    assert dialect.confident
+
+
+def test_sniff_quote_free(test_selection_data):
+    dialect = sniff(test_selection_data)
+    assert dialect.delimiter == ","
+    assert not dialect.quoted
+    assert dialect.confident
+
+
+def test_sniff_partial_sample(tmp_path):
+    path = tmp_path / "wide.tsv"
+    path.write_text("\t".join(f"col{i}" for i in range(1000)) + "\n")
+    dialect = sniff(path, sample_size=100)
+    assert dialect.delimiter == "\t"
+    assert dialect.confident
+    assert dialect.wide
+
+
+def test_sniff_single_column(tmp_path):
+    path = tmp_path / "single"
+    path.write_text("id\na\nb\n")
+    assert not sniff(path).confident
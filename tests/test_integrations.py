@@ -1,4 +1,14 @@
+import io
+import sys
+from pathlib import Path
+
+import pytest
+
+from metasplit import core
 from metasplit.core import metasplit, MetaPath
+from metasplit.dialect import sniff
+from metasplit.store import import_metadata
+from metasplit.writer import WriterOptions
 from tests.fixtures import test_matrix_data, test_selection_data
 
 
@@ -157,3 +167,112 @@ m
 s
 """
     assert written_data == expected
+
+
+def test_native_backend(test_matrix_data, test_selection_data, tmp_path):
+    query = f"{test_matrix_data}@id?col3=beta"
+    output_file = tmp_path / "out.csv"
+    metasplit(
+        [MetaPath(query)],
+        input_file=test_selection_data,
+        output_file=output_file,
+        always_include=["id5"],
+        backend="native",
+        writer_options=WriterOptions(block_size=4, threaded=True),
+    )
+
+    written_data = output_file.open("r").read()
+    expected = """id2,id4,id5,id6
+b,d,e,f
+h,j,k,l
+n,p,q,r
+t,v,w,x
+"""
+    assert written_data == expected
+
+
+def test_store_metadata(test_matrix_data, test_selection_data, tmp_path):
+    store = tmp_path / "meta.sqlite"
+    import_metadata(test_matrix_data, store)
+    output_file = tmp_path / "out.csv"
+    metasplit(
+        [MetaPath(f"{store}@id?col3=beta&col1!=[d,e,f]")],
+        input_file=test_selection_data,
+        output_file=output_file,
+        always_include=["id5"],
+        backend="native",
+    )
+
+    written_data = output_file.open("r").read()
+    expected = """id2,id5
+b,e
+h,k
+n,q
+t,w
+"""
+    assert written_data == expected
+
+
+def test_stdin_stdout(test_matrix_data, test_selection_data, tmp_path, monkeypatch):
+    store = tmp_path / "meta.sqlite"
+    import_metadata(test_matrix_data, store)
+    stdin = io.TextIOWrapper(io.BytesIO(test_selection_data.read_bytes()))
+    stdout = io.TextIOWrapper(io.BytesIO())
+    monkeypatch.setattr(sys, "stdin", stdin)
+    monkeypatch.setattr(sys, "stdout", stdout)
+
+    metasplit(
+        [MetaPath(f"{store}@id?col3=beta")],
+        input_file=Path("-"),
+        output_file=Path("-"),
+        backend="native",
+    )
+
+    expected = """id2,id4,id6
+b,d,f
+h,j,l
+n,p,r
+t,v,x
+"""
+    assert stdout.buffer.getvalue().decode() == expected
+    assert not list(tmp_path.glob(".*.tmp"))
+
+
+def test_parallel_quote_fallback(test_matrix_data, tmp_path, monkeypatch):
+    # Make the quote fall past the sample that the sniffer looks at
+    monkeypatch.setattr(core, "sniff", lambda source: sniff(source, 20))
+    input_file = tmp_path / "in.csv"
+    input_file.write_text("id1,id2,id3\n" + "1,2,3\n" * 2 + '4,"5,5",6\n')
+    output_file = tmp_path / "out.csv"
+    metasplit(
+        [MetaPath(f"{test_matrix_data}@id?col1=a")],
+        input_file=input_file,
+        output_file=output_file,
+        always_include=["id2"],
+        backend="parallel",
+        input_delimiter=",",
+    )
+
+    assert output_file.read_text() == 'id1,id2\n1,2\n1,2\n4,"5,5"\n'
+
+
+def test_head_preview(test_matrix_data, test_selection_data, tmp_path):
+    output_file = tmp_path / "out.csv"
+    metasplit(
+        [MetaPath(f"{test_matrix_data}@id?col3=beta")],
+        input_file=test_selection_data,
+        output_file=output_file,
+        head=1,
+    )
+
+    assert output_file.read_text() == "id2,id4,id6\nb,d,f\n"
+
+
+def test_parallel_stdout(test_matrix_data, test_selection_data):
+    with pytest.raises(ValueError):
+        metasplit(
+            [MetaPath(f"{test_matrix_data}@id?col3=beta")],
+            input_file=test_selection_data,
+            output_file=Path("-"),
+            backend="parallel",
+        )
@@ -0,0 +1,145 @@
+import pytest
+
+from metasplit import native
+from metasplit.native import iter_records, native_select, read_headers
+from metasplit.streams import open_input
+from tests.fixtures import test_matrix_data, test_tsv_data, test_selection_data
+
+
+def test_read_headers(test_matrix_data, test_tsv_data):
+    assert read_headers(test_matrix_data) == ["id", "col1", "col2", "col3", "col4"]
+    assert read_headers(test_tsv_data, "\t") == ["id", "col1", "col2", "col3", "col4"]
+
+
+def test_iter_records():
+    lines = [b"a,b\n", b'1,"2\n', b'2"\n', b"\r\n", b"3,4"]
+    assert list(iter_records(lines)) == [b"a,b\n", b'1,"2\n2"\n', b"3,4"]
+
+
+@pytest.mark.parametrize("quoted", [True, False])
+def test_native_select(test_selection_data, tmp_path, quoted):
+    output_file = tmp_path / "out.csv"
+    native_select(test_selection_data, output_file, [4, 1], quoted=quoted)
+    assert output_file.read_text() == "id2,id5\nb,e\nh,k\nn,q\nt,w\n"
+
+
+def test_native_select_tsv(test_tsv_data, tmp_path):
+    output_file = tmp_path / "out.csv"
+    native_select(test_tsv_data, output_file, [0, 4], delimiter="\t")
+    assert output_file.read_text() == (
+        "id,col4\nid1,some\ttext\nid2,more text\nid3,incredible\n"
+        "id4,wow\nid5,magic\nid6,generically wow\n"
+    )
+
+
+def test_fast_path_fallback(tmp_path):
+    input_file = tmp_path / "in.csv"
+    input_file.write_text('a,b,c\n1,2,3\n4,"5\n5",6\n7,"8,8",9\n')
+    output_file = tmp_path / "out.csv"
+    native_select(input_file, output_file, [1, 2], quoted=False)
+    assert output_file.read_text() == 'b,c\n2,3\n"5\n5",6\n"8,8",9\n'
+
+
+def test_fast_path_quotes_commas(tmp_path):
+    input_file = tmp_path / "in.tsv"
+    input_file.write_text("a\tb\r\n1,1\t2\r\n")
+    output_file = tmp_path / "out.csv"
+    native_select(input_file, output_file, [0, 1], delimiter="\t", quoted=False)
+    assert output_file.read_text() == 'a,b\n"1,1",2\n'
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 7, 1024])
+def test_streaming_select(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(native, "STREAM_CHUNK_SIZE", chunk_size)
+    input_file = tmp_path / "in.csv"
+    input_file.write_text(
+        'a,b,c,d\r\n1,"2,2",3,"4\n4"\r\n\r\n5,"6""6",7,8\n9,10,"11\n11",12'
+    )
+    output_file = tmp_path / "out.csv"
+    native_select(input_file, output_file, [1, 2], streaming=True)
+    assert output_file.read_text() == 'b,c\n"2,2",3\n"6""6",7\n10,"11\n11"\n'
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_streaming_quote_after_blank_line(tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(native, "STREAM_CHUNK_SIZE", chunk_size)
+    input_file = tmp_path / "in.csv"
+    input_file.write_bytes(b'\r\n"a",b\n\n"y,1",d\n')
+    output_file = tmp_path / "out.csv"
+    native_select(input_file, output_file, [0, 1], streaming=True)
+    assert output_file.read_text() == 'a,b\n"y,1",d\n'
+
+
+@pytest.mark.parametrize("chunk_size", [1, 3, 1024])
+def test_streaming_quoted_tail(tmp_path, monkeypatch, chunk_size):
+    # Quotes after the last selected field, both stray and around newlines
+    monkeypatch.setattr(native, "STREAM_CHUNK_SIZE", chunk_size)
+    input_file = tmp_path / "in.csv"
+    input_file.write_text('a,b"c,"x\ny",d\n1,2,3,"4"\n5,6"",7,8\n')
+    streamed, parsed = tmp_path / "streamed.csv", tmp_path / "parsed.csv"
+    native_select(input_file, streamed, [0], streaming=True)
+    native_select(input_file, parsed, [0])
+    assert streamed.read_text() == parsed.read_text() == "a\n1\n5\n"
+
+
+TOKENIZERS = {
+    "csv": dict(quoted=True),
+    "fast": dict(quoted=False),
+    "stream": dict(streaming=True),
+}
+
+
+@pytest.mark.parametrize("tokenizer", TOKENIZERS)
+def test_short_row(tmp_path, tokenizer):
+    input_file = tmp_path / "in.csv"
+    input_file.write_text("a,b,c\n1,2\n")
+    with pytest.raises(ValueError, match="2 fields, but column 2"):
+        native_select(input_file, tmp_path / "out.csv", [2], **TOKENIZERS[tokenizer])
+
+
+@pytest.mark.parametrize("tokenizer", ["csv", "stream"])
+def test_lone_carriage_return(tmp_path, tokenizer):
+    input_file = tmp_path / "in.csv"
+    input_file.write_bytes(b'"a\rb",c\n')
+    output_file = tmp_path / "out.csv"
+    native_select(input_file, output_file, [0, 1], **TOKENIZERS[tokenizer])
+    assert output_file.read_bytes() == b'"a\rb",c\n'
+
+
+@pytest.mark.parametrize("tokenizer", TOKENIZERS)
+def test_single_empty_field(tmp_path, tokenizer):
+    input_file = tmp_path / "in.tsv"
+    input_file.write_text("a\tb\n\t\n1\t2\n")
+    output_file = tmp_path / "out.csv"
+    native_select(input_file, output_file, [1], delimiter="\t", **TOKENIZERS[tokenizer])
+    assert output_file.read_text() == 'b\n""\n2\n'
+
+
+def test_peeked_headers(tmp_path):
+    input_file = tmp_path / "in.csv"
+    input_file.write_text('a,"b\nb",c\n1,2,3\n')
+    output_file = tmp_path / "out.csv"
+    with open_input(input_file) as source:
+        assert read_headers(source) == ["a", "b\nb", "c"]
+        native_select(source, output_file, [1])
+    assert output_file.read_text() == '"b\nb"\n2\n'
+
+
+@pytest.mark.parametrize(
+    "quoted,streaming", [(True, False), (False, False), (True, True)]
+)
+def test_bytes_passthrough(tmp_path, quoted, streaming):
+    # Latin-1 encoded cells, that are not valid UTF-8
+    input_file = tmp_path / "in.csv"
+    input_file.write_bytes(b"caf\xe9,b\nna\xefve,\xff\xfe\n")
+    output_file = tmp_path / "out.csv"
+    native_select(input_file, output_file, [0, 1], quoted=quoted, streaming=streaming)
+    assert output_file.read_bytes() == b"caf\xe9,b\nna\xefve,\xff\xfe\n"
+
+
+def test_read_headers_encoding(tmp_path):
+    input_file = tmp_path / "in.csv"
+    input_file.write_bytes(b"caf\xe9,b\n1,2\n")
+    assert read_headers(input_file, encoding="latin-1") == ["café", "b"]
+    # Invalid bytes are kept, and not replaced
+    assert read_headers(input_file)[0].encode(errors="surrogateescape") == b"caf\xe9"
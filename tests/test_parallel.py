@@ -0,0 +1,47 @@
+import pytest
+
+from metasplit import parallel
+from metasplit.parallel import QuoteFoundError, parallel_select
+from metasplit.writer import WriterOptions
+from tests.fixtures import test_selection_data
+
+
+@pytest.mark.parametrize("chunk_size", [1, 5, 16, 1024])
+def test_parallel_select(test_selection_data, tmp_path, monkeypatch, chunk_size):
+    monkeypatch.setattr(parallel, "PARALLEL_CHUNK_SIZE", chunk_size)
+    output_file = tmp_path / "out.csv"
+    parallel_select(test_selection_data, output_file, [4, 1], processes=2)
+    assert output_file.read_text() == "id2,id5\nb,e\nh,k\nn,q\nt,w\n"
+
+
+def test_parallel_in_flight_budget(test_selection_data, tmp_path, monkeypatch):
+    # With 4 processes and 8 chunks in flight, chunks shrink to 2 bytes
+    monkeypatch.setattr(parallel, "PARALLEL_MAX_IN_FLIGHT", 16)
+    output_file = tmp_path / "out.csv"
+    parallel_select(test_selection_data, output_file, [4, 1], processes=4)
+    assert output_file.read_text() == "id2,id5\nb,e\nh,k\nn,q\nt,w\n"
+
+
+def test_parallel_select_compressed(test_selection_data, tmp_path, monkeypatch):
+    import gzip
+
+    monkeypatch.setattr(parallel, "PARALLEL_CHUNK_SIZE", 8)
+    output_file = tmp_path / "out.csv.gz"
+    parallel_select(
+        test_selection_data,
+        output_file,
+        [0, 5],
+        processes=2,
+        writer_options=WriterOptions(compression="bgzf"),
+    )
+    assert gzip.decompress(output_file.read_bytes()) == b"id1,id6\na,f\ng,l\nm,r\ns,x\n"
+
+
+def test_parallel_select_quotes(tmp_path, monkeypatch):
+    monkeypatch.setattr(parallel, "PARALLEL_CHUNK_SIZE", 8)
+    input_file = tmp_path / "in.csv"
+    input_file.write_text('a,b,c\n1,2,3\n4,5,6\n7,"8,8",9\n')
+    output_file = tmp_path / "out.csv"
+    with pytest.raises(QuoteFoundError):
+        parallel_select(input_file, output_file, [1], processes=2)
+    assert not output_file.exists()
@@ -0,0 +1,92 @@
+import csv
+import io
+import random
+
+import pytest
+
+from metasplit import native
+from metasplit.preview import preview_select, sample_records
+from metasplit.streams import open_input
+from tests.fixtures import test_selection_data
+
+
+def test_sample_records():
+    records = [str(i).encode() for i in range(1000)]
+    sample = sample_records(iter(records), 10, random.Random(42))
+    assert len(sample) == 10
+    assert len(set(sample)) == 10
+    assert sample == sorted(sample, key=int)  # The input order is kept
+    assert sample == sample_records(iter(records), 10, random.Random(42))
+    assert sample_records(iter(records[:3]), 10) == records[:3]
+
+
+def test_sample_keep():
+    records = iter([b"a", b"b", b"c"])
+    assert sample_records(records, 5, keep=bytes.upper) == [b"A", b"B", b"C"]
+
+
+def test_sample_uniform():
+    rng = random.Random(1)
+    counts = [0] * 20
+    for _ in range(2000):
+        for record in sample_records(iter(range(20)), 5, rng):
+            counts[record] += 1
+    # Each record is expected 500 times
+    assert all(400 < x < 600 for x in counts)
+
+
+@pytest.mark.parametrize("quoted", [True, False])
+@pytest.mark.parametrize("streaming", [True, False])
+def test_preview_head(tmp_path, quoted, streaming):
+    input_file = tmp_path / "in.csv"
+    input_file.write_text('a,b\n1,"x\ny"\n\n2,z\n3,w\n')
+    output_file = tmp_path / "out.csv"
+    with open_input(input_file) as source:
+        preview_select(
+            source, output_file, [1], head=2, quoted=quoted, streaming=streaming
+        )
+    assert output_file.read_text() == 'b\n"x\ny"\nz\n'
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_preview_head_stops_early(tmp_path, streaming):
+    input_file = tmp_path / "in.csv"
+    input_file.write_text("a,b,c\n" + "1,2,3\n" * 500_000)
+    output_file = tmp_path / "out.csv"
+    with open_input(input_file) as source:
+        preview_select(
+            source, output_file, [0, 2], head=2, quoted=False, streaming=streaming
+        )
+        assert source.tell() < input_file.stat().st_size
+    assert output_file.read_text() == "a,c\n1,3\n1,3\n"
+
+
+@pytest.mark.parametrize("streaming", [True, False])
+def test_preview_sample(tmp_path, streaming):
+    input_file = tmp_path / "in.csv"
+    input_file.write_text('a,b\n1,"x\ny"\n2,"z"\n3,w')
+    output_file = tmp_path / "out.csv"
+    with open_input(input_file) as source:
+        preview_select(source, output_file, [1], sample=5, streaming=streaming)
+    assert output_file.read_text() == 'b\n"x\ny"\nz\nw\n'
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+def test_preview_sample_streaming(tmp_path, monkeypatch, chunk_size):
+    # Skipping rows in the tokenizer must pick the same sample as reading them
+    monkeypatch.setattr(native, "STREAM_CHUNK_SIZE", chunk_size)
+    rows = [
+        f'{i},"x,\n{i}",{i * 2}\n' if i % 3 else f"{i},y,{i * 2}\n" for i in range(200)
+    ]
+    input_file = tmp_path / "in.csv"
+    input_file.write_text("a,b,c\n\n" + "\r\n".join(rows) + "\n")
+    outputs = []
+    for streaming in (False, True):
+        output_file = tmp_path / f"out_{streaming}.csv"
+        with open_input(input_file) as source:
+            preview_select(
+                source, output_file, [0, 1], sample=10, seed=4, streaming=streaming
+            )
+        outputs.append(output_file.read_bytes())
+    assert outputs[0] == outputs[1]
+    assert len(list(csv.reader(io.StringIO(outputs[1].decode())))) == 11
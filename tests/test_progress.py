@@ -0,0 +1,35 @@
+import json
+
+from metasplit.native import native_select
+from metasplit.progress import Progress
+from tests.fixtures import test_selection_data
+
+
+def test_progress_status():
+    progress = Progress(total_bytes=1000, interval=3600)
+    progress.track(lambda: 250)
+    progress.start()
+    progress.update(10)
+    # Not enough time has passed to look up the position
+    assert progress.bytes_done == 0
+    assert progress.rows_done == 10
+
+    progress.bytes_done = 250
+    status = progress.status(now=progress._start + 2)
+    assert status["fraction"] == 0.25
+    assert status["rows_per_s"] == 5
+    assert status["eta_s"] == 6
+
+
+def test_progress_file(test_selection_data, tmp_path):
+    progress_file = tmp_path / "progress.jsonl"
+    progress = Progress(interval=0, file=progress_file)
+    progress.total_bytes = test_selection_data.stat().st_size
+    native_select(
+        test_selection_data, tmp_path / "out.csv", [0], quoted=False, progress=progress
+    )
+
+    reports = [json.loads(x) for x in progress_file.read_text().splitlines()]
+    assert reports[-1]["done"]
+    assert reports[-1]["rows"] == 5
+    assert reports[-1]["fraction"] == 1
@@ -0,0 +1,54 @@
+import pytest
+
+from metasplit.core import MetaPath
+from metasplit.errors import NoSelectionError
+from metasplit.store import import_metadata, select_store_ids
+from tests.fixtures import test_matrix_data
+
+
+@pytest.fixture
+def test_store(test_matrix_data, tmp_path):
+    path = tmp_path / "meta.sqlite"
+    import_metadata(test_matrix_data, path, index_columns=["col1", "col3"])
+    return path
+
+
+@pytest.mark.parametrize(
+    "query,expected",
+    [
+        ("?col3=beta", ["id2", "id4", "id6"]),
+        ("?col3=beta&col1!=[d,e,f]", ["id2"]),
+        ("?col3=beta|col1!=[d,e,f]", ["id1", "id2", "id3", "id4", "id6"]),
+        ("?col3=beta&col1=[a,b,c]&col1!=a", ["id2"]),
+        ("?col3=beta|col1=[a,b,c]&col1!=a", ["id2", "id3", "id4", "id6"]),
+        ("?col1=zzz", []),
+    ],
+)
+def test_select_store_ids(test_store, query, expected):
+    if not expected:
+        with pytest.raises(NoSelectionError):
+            select_store_ids(MetaPath(f"{test_store}@id{query}"))
+        return
+    assert select_store_ids(MetaPath(f"{test_store}@id{query}")) == expected
+
+
+def test_store_quoted_values(test_store):
+    assert select_store_ids(MetaPath(f"{test_store}@id?col4=more text")) == ["id2"]
+
+
+def test_import_blank_lines(tmp_path):
+    metadata = tmp_path / "meta.csv"
+    metadata.write_text("id,kind\na,x\n\nb,y\n\n")
+    store = tmp_path / "meta.sqlite"
+    import_metadata(metadata, store)
+    assert select_store_ids(MetaPath(f"{store}@id?kind=[x,y]")) == ["a", "b"]
+
+
+def test_import_failure_keeps_store(test_store, tmp_path):
+    metadata = tmp_path / "bad.csv"
+    metadata.write_text("id,kind\na,x\nb\n")
+    before = test_store.read_bytes()
+    with pytest.raises(ValueError, match="Line 3"):
+        import_metadata(metadata, test_store)
+    assert test_store.read_bytes() == before
+    assert not list(tmp_path.glob(".*.tmp"))
@@ -0,0 +1,110 @@
+import gzip
+import os
+import stat
+import threading
+
+import pytest
+
+from metasplit.writer import BlockWriter, WriterOptions, bgzf_compress
+
+
+DATA = b"".join(f"row{i},{i},{i * 2}\n".encode() for i in range(20000))
+
+
+@pytest.mark.parametrize("threaded", [False, True])
+def test_block_writer(tmp_path, threaded):
+    path = tmp_path / "out.csv"
+    with BlockWriter(path, WriterOptions(block_size=1000, threaded=threaded)) as writer:
+        for start in range(0, len(DATA), 333):
+            writer.write(DATA[start : start + 333])
+        assert not path.exists()
+
+    assert path.read_bytes() == DATA
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_block_writer_bgzf(tmp_path):
+    path = tmp_path / "out.csv.gz"
+    options = WriterOptions(
+        block_size=100_000, compression="bgzf", compression_threads=3
+    )
+    with BlockWriter(path, options) as writer:
+        writer.write(DATA)
+
+    assert gzip.decompress(path.read_bytes()) == DATA
+
+
+def test_block_writer_zstd(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / "out.csv.zst"
+    options = WriterOptions(block_size=1000, compression="zstd", compression_threads=8)
+    with BlockWriter(path, options) as writer:
+        for start in range(0, len(DATA), 333):
+            writer.write(DATA[start : start + 333])
+
+    with zstandard.ZstdDecompressor().stream_reader(path.read_bytes()) as reader:
+        assert reader.read() == DATA
+
+
+def test_block_writer_permissions(tmp_path):
+    path = tmp_path / "out.csv"
+    umask = os.umask(0o022)
+    try:
+        with BlockWriter(path) as writer:
+            writer.write(DATA)
+    finally:
+        os.umask(umask)
+    assert stat.S_IMODE(path.stat().st_mode) == 0o644
+
+    # Replacing a file keeps its permissions
+    path.chmod(0o640)
+    with BlockWriter(path) as writer:
+        writer.write(DATA)
+    assert stat.S_IMODE(path.stat().st_mode) == 0o640
+
+
+def test_block_writer_symlink(tmp_path):
+    target = tmp_path / "target.csv"
+    target.write_bytes(b"old")
+    link = tmp_path / "link.csv"
+    link.symlink_to(target)
+    with BlockWriter(link) as writer:
+        writer.write(DATA)
+
+    assert link.is_symlink()
+    assert target.read_bytes() == DATA
+
+
+def test_block_writer_fifo(tmp_path):
+    fifo = tmp_path / "out.fifo"
+    os.mkfifo(fifo)
+    received = []
+    reader = threading.Thread(target=lambda: received.append(fifo.read_bytes()))
+    reader.start()
+    with BlockWriter(fifo, WriterOptions(block_size=1000)) as writer:
+        writer.write(DATA)
+    reader.join()
+
+    assert received == [DATA]
+    assert stat.S_ISFIFO(fifo.stat().st_mode)
+
+
+def test_bgzf_blocks():
+    compressed = bgzf_compress(b"hello")
+    assert compressed[12:14] == b"BC"
+    # BSIZE is the total block size minus one
+    assert int.from_bytes(compressed[16:18], "little") == len(compressed) - 1
+    assert gzip.decompress(compressed) == b"hello"
+
+
+def test_block_writer_abort(tmp_path):
+    path = tmp_path / "out.csv"
+    path.write_bytes(b"old")
+
+    with pytest.raises(RuntimeError):
+        with BlockWriter(path, WriterOptions(block_size=10)) as writer:
+            writer.write(DATA)
+            raise RuntimeError("Something broke")
+
+    assert path.read_bytes() == b"old"
+    assert list(tmp_path.iterdir()) == [path]